@@ -1,19 +1,44 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, stream_with_context, g, send_from_directory
 from flask_cors import CORS
 from dotenv import load_dotenv
 from functools import wraps
 import os
 import re
 import datetime
+import base64
+import csv
+import io
+import hashlib
+import json
+import random
+import threading
+import time
+import types
+import uuid
 import jwt
-import bcrypt
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from openai import OpenAI
+import openai
 import stripe
 
 
-from db import get_db
+import db
+from db import get_db, release_thread_connections, pool_stats, PoolTimeout, DATABASE_URL
+from metrics import registry as metrics
+from profiler import sampler, save_profile, list_profiles, PROFILE_DIR
+from cache import TTLCache, NotifyListener
+from pubsub import FanoutHub
+from schedule import (TIME_SLOTS, DAY_START, DAY_END, DEFAULT_DURATION, WEEKDAY_NAMES, IntervalIndex,
+                      booking_interval, parse_minutes, format_minutes, is_open, is_slot_start,
+                      mask_index, free_starts, earliest_free)
+from occupancy import (AVAILABILITY_CHANNEL, booking_mask, lock_days, mark_booked, refresh_day,
+                       notify_availability_change)
+from faq_search import BM25Index, format_chunks
+from upstream import Upstream, CircuitBreaker, UpstreamUnavailable
+from passwords import password_hasher, HashingBusy
+from limits import Bulkhead, RateLimiter, LimitExceeded
+from webhook_worker import WebhookWorker, ingest_event, replay_events
 
 load_dotenv()
 
@@ -21,10 +46,133 @@ load_dotenv()
 app = Flask(__name__)
 CORS (app)
 
+
+# ---- metrics (/metrics) ----
+metrics.counter("http_requests_total", "HTTP requests by route, method and status.")
+metrics.histogram("http_request_duration_seconds", "Request latency by route and method.")
+metrics.histogram("db_query_duration_seconds", "Statement latency by operation and table.")
+metrics.histogram("db_connection_acquire_seconds", "Time spent waiting for a pooled connection.")
+metrics.histogram("upstream_call_duration_seconds", "OpenAI/Stripe call latency by outcome.",
+                  buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0))
+metrics.counter("upstream_calls_total", "OpenAI/Stripe calls by outcome.")
+metrics.gauge("db_pool_connections", "Pooled connections by state.")
+metrics.gauge("live_subscribers", "Open /api/availability/live streams.")
+metrics.counter("live_rejected_total", "Live availability streams refused because the process was full.")
+metrics.counter("limiter_decisions_total", "Bulkhead and rate-limit decisions by limiter and outcome.")
+metrics.gauge("bulkhead_in_flight", "Requests currently holding a bulkhead slot, by endpoint class.")
+metrics.gauge("bulkhead_capacity", "Configured concurrent requests per endpoint class.")
+metrics.gauge("rate_limiter_clients", "Clients currently tracked by a rate limiter.")
+
+SQL_TARGET_RE = re.compile(r"\b(FROM|INTO|UPDATE|JOIN)\s+([a-z_][a-z0-9_]*)", re.IGNORECASE)
+
+
+# Low-cardinality label for a statement: "select bookings", "insert bookings", ...
+def sql_label(sql):
+    text = sql.decode("utf-8", "replace") if isinstance(sql, bytes) else str(sql)
+    words = text.split()
+    operation = next((w.lower() for w in words if w.upper() in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "CREATE", "ALTER")), "other")
+    target = SQL_TARGET_RE.search(text)
+    return operation, target.group(2).lower() if target else "none"
+
+
+def observe_query(sql, seconds):
+    operation, table = sql_label(sql)
+    metrics.observe("db_query_duration_seconds", seconds, {"operation": operation, "table": table})
+
+
+def observe_upstream(name, outcome, seconds):
+    metrics.inc("upstream_calls_total", {"upstream": name, "outcome": outcome})
+    if outcome != "rejected":
+        metrics.observe("upstream_call_duration_seconds", seconds, {"upstream": name, "outcome": outcome})
+
+
+def pool_gauges():
+    stats = pool_stats()
+    yield "db_pool_connections", {"state": "in_use"}, stats["in_use"]
+    yield "db_pool_connections", {"state": "idle"}, stats["idle"]
+
+
+def live_gauges():
+    yield "live_subscribers", None, availability_hub.stats()["subscribers"]
+
+
+def observe_limiter(kind, name, outcome):
+    metrics.inc("limiter_decisions_total", {"kind": kind, "limiter": name, "outcome": outcome})
+
+
+def limiter_gauges():
+    for name, limit in bulkheads.items():
+        stats = limit.stats()
+        yield "bulkhead_in_flight", {"class": name}, stats["in_flight"]
+        yield "bulkhead_capacity", {"class": name}, stats["max_concurrent"]
+    yield "rate_limiter_clients", {"limiter": faq_rate_limiter.name}, faq_rate_limiter.stats()["clients"]
+
+
+db.query_observers.append(observe_query)
+db.acquire_observers.append(lambda seconds: metrics.observe("db_connection_acquire_seconds", seconds))
+metrics.add_gauge_callback(pool_gauges)
+metrics.add_gauge_callback(live_gauges)
+metrics.add_gauge_callback(limiter_gauges)
+
+
+@app.before_request
+def start_request_timer():
+    metrics.ensure_flusher()
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        # Route template, not the raw path, so /api/bookings/<id> stays one series.
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.inc("http_requests_total", {"route": route, "method": request.method, "status": response.status_code})
+        metrics.observe("http_request_duration_seconds", time.perf_counter() - started, {"route": route, "method": request.method})
+    return response
+
+
+# Each gunicorn worker starts its webhook worker lazily (after fork) on its first request.
+@app.before_request
+def start_background_workers():
+    if WEBHOOK_WORKER_ENABLED:
+        webhook_worker.ensure_started()
+
+
+# Any connection a handler forgot to close (early return, uncaught error) goes back to the pool here.
+@app.teardown_request
+def return_db_connections(exc):
+    release_thread_connections()
+
+
+@app.errorhandler(PoolTimeout)
+def handle_pool_timeout(e):
+    return jsonify({"error": "Server is busy, please try again"}), 503
+
+
+# Login/register bursts get a quick 503 instead of queueing behind bcrypt.
+@app.errorhandler(HashingBusy)
+def handle_hashing_busy(e):
+    response = jsonify({"error": "Server is busy, please try again"})
+    response.headers["Retry-After"] = "2"
+    return response, 503
+
+
+@app.errorhandler(LimitExceeded)
+def handle_limit_exceeded(e):
+    if e.status == 429:
+        response = jsonify({"error": "Too many requests, please slow down"})
+    else:
+        response = jsonify({"error": "Server is busy, please try again"})
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response, e.status
+
 # JWT secret comes from .env so I never leak it into git.
 JWT_SECRET = os.getenv("JWT_SECRET")
 
 stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+# Retries live in stripe_upstream below so they share one budget, timeout and breaker.
+stripe.max_network_retries = 0
 
 ALLOWED_EMAIL_DOMAINS = {
     "gmail.com",
@@ -38,79 +186,497 @@ ALLOWED_EMAIL_DOMAINS = {
     "mac.com",
 }
 
-openai_client = OpenAI(api_key = os.getenv("OPENAI_API_KEY"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "15"))
+STRIPE_TIMEOUT = float(os.getenv("STRIPE_TIMEOUT", "10"))
+
+openai_client = OpenAI(api_key = os.getenv("OPENAI_API_KEY"), timeout=OPENAI_TIMEOUT, max_retries=0)
+# The upstream timeout only stops us waiting; this one actually drops the socket, so a
+# timed-out checkout can't finish in the background and keep a pool thread busy for ~80 s.
+stripe.default_http_client = stripe.RequestsClient(timeout=STRIPE_TIMEOUT)
+
+# Worth retrying (and counting against the breaker): the provider didn't answer or was overloaded.
+# Bad requests, auth failures, declined cards and idempotency conflicts are raised as-is.
+OPENAI_TRANSIENT_ERRORS = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+STRIPE_TRANSIENT_ERRORS = (stripe.APIConnectionError, stripe.RateLimitError, stripe.APIError)
+
+# OpenAI and Stripe calls run on their own small thread pools with timeouts, jittered retries
+# and a circuit breaker, so a slow provider can't hold every web worker hostage.
+openai_upstream = Upstream(
+    "openai",
+    max_workers=int(os.getenv("OPENAI_MAX_CONCURRENCY", "4")),
+    max_queue=int(os.getenv("OPENAI_MAX_QUEUE", "8")),
+    timeout=OPENAI_TIMEOUT,
+    retries=int(os.getenv("OPENAI_RETRIES", "1")),
+    breaker=CircuitBreaker(threshold=5, reset_seconds=30),
+    retry_on=OPENAI_TRANSIENT_ERRORS,
+    observer=observe_upstream,
+)
+stripe_upstream = Upstream(
+    "stripe",
+    max_workers=int(os.getenv("STRIPE_MAX_CONCURRENCY", "4")),
+    max_queue=int(os.getenv("STRIPE_MAX_QUEUE", "8")),
+    timeout=STRIPE_TIMEOUT,
+    retries=int(os.getenv("STRIPE_RETRIES", "2")),
+    breaker=CircuitBreaker(threshold=5, reset_seconds=30),
+    retry_on=STRIPE_TRANSIENT_ERRORS,
+    observer=observe_upstream,
+)
+
+
+# Bulkheads only for classes that wait on something slow or external (the model,
+# Stripe, bcrypt, open live streams), so a burst of them can't take the threads
+# that availability and booking need. Core reads and writes aren't capped here:
+# they are short, and the DB pool (DB_POOL_MAX / PoolTimeout) already bounds them.
+# Budgets are per process. gunicorn.conf.py exports the real thread count
+# (WEB_THREADS) before the app loads; each slow class defaults to an eighth of it.
+WEB_THREADS = max(1, int(os.getenv("WEB_THREADS", "16")))
+# gevent/eventlet workers export this from their gunicorn config (see gunicorn_live.conf.py).
+COOPERATIVE_WORKER = os.getenv("WEB_WORKER_CLASS", "gthread") in ("gevent", "eventlet")
+
+
+def bulkhead_budget(name):
+    return int(os.getenv(f"BULKHEAD_{name.upper()}", str(max(1, WEB_THREADS // 8))))
+
+
+bulkheads = {
+    "llm": Bulkhead("llm", bulkhead_budget("llm"), retry_after=5, observer=observe_limiter),
+    "payments": Bulkhead("payments", bulkhead_budget("payments"), retry_after=2, observer=observe_limiter),
+    "auth": Bulkhead("auth", bulkhead_budget("auth"), max_wait=0.1, retry_after=2, observer=observe_limiter),
+    # Under gthread, each open SSE stream pins a request thread for up to LIVE_MAX_SECONDS.
+    "live": Bulkhead("live", bulkhead_budget("live"), retry_after=5, observer=observe_limiter),
+}
+
+
+# Anonymous chat endpoints are the easiest to abuse, so each client also gets a token bucket.
+# FAQ_RATE_PER_MINUTE=0 turns it off.
+faq_rate_limiter = RateLimiter(
+    "faq",
+    rate=float(os.getenv("FAQ_RATE_PER_MINUTE", "10")) / 60,
+    burst=int(os.getenv("FAQ_RATE_BURST", "5")),
+    observer=observe_limiter,
+)
+
+# Proxies in front of the app (Railway's edge counts as one) each append to X-Forwarded-For.
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "1"))
+
+
+def client_address():
+    forwarded = [part.strip() for part in request.headers.get("X-Forwarded-For", "").split(",") if part.strip()]
+    # Count from the right: anything left of what our own proxies appended is client-supplied.
+    if TRUSTED_PROXY_HOPS and len(forwarded) >= TRUSTED_PROXY_HOPS:
+        return forwarded[-TRUSTED_PROXY_HOPS]
+    return request.remote_addr or "unknown"
+
+
+def bulkhead(name):
+    limit = bulkheads[name]
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            limit.acquire()
+            try:
+                response = app.make_response(fn(*args, **kwargs))
+            except BaseException:
+                limit.release()
+                raise
+            if response.is_streamed:
+                # Streamed bodies (CSV export) keep their slot until the last byte is sent.
+                response.call_on_close(limit.release)
+            else:
+                limit.release()
+            return response
+        return wrapper
+    return decorator
+
+
+def thread_bulkhead(name):
+    # For endpoints whose cost is a held request thread. Under a cooperative worker
+    # (gunicorn_live.conf.py) a request is a greenlet, so there's nothing to ration.
+    if COOPERATIVE_WORKER:
+        return lambda fn: fn
+    return bulkhead(name)
+
+
+def rate_limited(limiter):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            limiter.check(client_address())
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
 
 
 FAQ_PATH = "faq_data.txt"
 
-# Static schedule for availability endpoints (UI-driven booking only).
-TIME_SLOTS = [
-    "09:00",
-    "10:00",
-    "11:00",
-    "12:00",
-    "13:00",
-    "14:00",
-    "15:00",
-    "16:00",
-    "17:00"
-]
+# Cap for range queries so one request can't ask for years of grid.
+MAX_AVAILABILITY_DAYS = 31
 
+# Booked-slot mask per (service, date). Only the raw mask is cached; past-slot masking runs on every read.
+availability_cache = TTLCache(
+    maxsize=int(os.getenv("AVAILABILITY_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("AVAILABILITY_CACHE_TTL", "60")),
+)
+
+def availability_snapshot(key):
+    service, date_main = key
+    return build_slot_map(date_main, get_booked_mask(service, date_main), datetime.datetime.now(),
+                          service_duration(service))
+
+
+# Live (service, date) slot maps for /api/availability/live. Every booking write already
+# NOTIFYs AVAILABILITY_CHANNEL, so every create and delete reaches subscribers.
+availability_hub = FanoutHub(
+    availability_snapshot,
+    # Idle subscribers cost a queue each, so this is sized for the live process's
+    # connections, not for threads; gthread workers hit bulkheads["live"] long before it.
+    max_subscribers=int(os.getenv("LIVE_MAX_SUBSCRIBERS", "5000")),
+    max_pending=int(os.getenv("LIVE_MAX_PENDING", "100")),
+)
+
+
+def _on_availability_notify(payload):
+    date_string, _, service = payload.partition("|")
+    try:
+        key = (service, datetime.date.fromisoformat(date_string))
+    except ValueError:
+        availability_cache.clear()
+        availability_hub.mark_all_dirty()
+        return
+    # Drop the cache first so the hub's recompute reads the committed state.
+    availability_cache.delete(key)
+    availability_hub.mark_dirty(key)
+
+
+def _on_availability_reset():
+    availability_cache.clear()
+    # Changes may have been missed while disconnected; re-diff everything being watched.
+    availability_hub.mark_all_dirty()
+
+
+# One LISTEN connection per worker, shared by every cache that needs cross-worker invalidation.
+notify_listener = NotifyListener(DATABASE_URL)
+notify_listener.subscribe(AVAILABILITY_CHANNEL, _on_availability_notify, on_reset=_on_availability_reset)
+
+
+# Public services catalog. Admin mutations bump the version (locally and via NOTIFY);
+# readers rebuild the serialized body only when the version they cached is stale.
+SERVICES_CHANNEL = "services_changed"
+SERVICES_MAX_AGE = int(os.getenv("SERVICES_CACHE_MAX_AGE", "60"))
+
+services_catalog = {"version": 0, "built_version": None, "body": None, "etag": None, "durations": None}
+services_catalog_lock = threading.Lock()
+
+
+def bump_services_version(payload=None):
+    with services_catalog_lock:
+        services_catalog["version"] += 1
+
+
+notify_listener.subscribe(SERVICES_CHANNEL, bump_services_version, on_reset=bump_services_version)
+
+
+def notify_services_change(cur):
+    cur.execute("SELECT pg_notify(%s, '');", (SERVICES_CHANNEL,))
+
+
+# Call after commit so this worker doesn't wait on its own notification.
+def invalidate_availability(service, booking_date):
+    availability_cache.delete((service, booking_date))
+
+
+def get_booked_mask(service, date_main):
+    notify_listener.ensure_started()
+    # Without a live listener we could miss other workers' writes, so skip the cache entirely.
+    use_cache = notify_listener.connected
+    key = (service, date_main)
+
+    if use_cache:
+        booked_mask = availability_cache.get(key)
+        if booked_mask is not None:
+            return booked_mask
+        # Taken before the SELECT: if a NOTIFY drops this key while we read, our
+        # (possibly pre-write) mask is not cached for the full TTL.
+        fill_token = availability_cache.fill_token()
+
+    connection = get_db()
+    cur = connection.cursor()
+    try:
+        # Primary-key lookup on the bitmap row instead of scanning that day's bookings.
+        cur.execute("""
+                    SELECT booked_mask
+                    FROM slot_occupancy
+                    WHERE service = %s AND date = %s;
+                    """, (service, date_main))
+        row = cur.fetchone()
+        booked_mask = row["booked_mask"] if row else 0
+    finally:
+        connection.close()
+
+    if use_cache:
+        availability_cache.set(key, booked_mask, token=fill_token)
+    return booked_mask
+
+
+# FAQ text (and its search index) is re-read only when the file's mtime/size changes; version changes with the content.
+faq_file_cache = {"stamp": None, "text": "", "version": "", "index": None}
+faq_file_lock = threading.Lock()
+
+# Answers keyed by (FAQ version, normalized question) so editing the FAQ naturally retires old answers.
+faq_answer_cache = TTLCache(
+    maxsize=int(os.getenv("FAQ_ANSWER_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("FAQ_ANSWER_CACHE_TTL", "3600")),
+)
+
+
+# Retrieval settings: how many FAQ chunks go into the prompt, and whether a clear match skips the LLM.
+FAQ_TOP_K = int(os.getenv("FAQ_TOP_K", "4"))
+FAQ_DIRECT_ANSWERS = os.getenv("FAQ_DIRECT_ANSWERS", "1") == "1"
+
+
+def _load_faq_entry():
+    try:
+        st = os.stat(FAQ_PATH)
+    except FileNotFoundError:
+        return None
+
+    stamp = (st.st_mtime_ns, st.st_size)
+    with faq_file_lock:
+        if faq_file_cache["stamp"] == stamp:
+            return dict(faq_file_cache)
 
-def load_faq_text():
-    
     try:
         with open(FAQ_PATH, "r", encoding="utf-8") as f:
-            return f.read()
+            text = f.read()
     except FileNotFoundError:
-        return ""
+        return None
+
+    version = hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+    index = BM25Index.from_text(text)
+    with faq_file_lock:
+        faq_file_cache.update({"stamp": stamp, "text": text, "version": version, "index": index})
+        return dict(faq_file_cache)
+
+
+def load_faq():
+    entry = _load_faq_entry()
+    if entry is None:
+        return "", ""
+    return entry["text"], entry["version"]
+
+
+def load_faq_index():
+    entry = _load_faq_entry()
+    return entry["index"] if entry else None
+
+
+def load_faq_text():
+    return load_faq()[0]
+
+
+# "Opening hours?" and "opening  hours" should share a cache entry.
+def normalize_query(text):
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+FAQ_SYSTEM_PROMPT = ("You are a helpful salon assistant. "
+                     "Answer the user's question using ONLY the FAQ information provided. "
+                     "Be friendly and concise. "
+                     "If the answer is not in the FAQ, say you are not sure and suggest contacting the salon.")
+
+
+def build_faq_messages(user_input, faq_context):
+    return [
+        {
+            "role": "system",
+            "content": FAQ_SYSTEM_PROMPT
+        },
+        {
+            "role":"system",
+            "content":f"FAQ INFORMATION: \n{faq_context}"
+        },
+        {
+            "role":"user",
+            "content": user_input
+        }
+    ]
+
+
+def openai_complete(messages):
+    response = openai_client.chat.completions.create(
+        model = "gpt-4o-mini",
+        messages=messages,
+        temperature=0.3,
+        max_tokens=250
+    )
+    return response.choices[0].message.content
+
+
+# Opens the stream eagerly (so the upstream wrapper can time it) and returns a token iterator.
+def openai_stream(messages):
+    stream = openai_client.chat.completions.create(
+        model = "gpt-4o-mini",
+        messages=messages,
+        temperature=0.3,
+        max_tokens=250,
+        stream=True
+    )
+    return _iter_openai_stream(stream)
+
+
+def _iter_openai_stream(stream):
+    try:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        # Closing drops the upstream HTTP stream when our client goes away mid-answer.
+        stream.close()
+
+
+# Offline stand-in for the model: answers with the first FAQ line it was given, word by word.
+def fake_complete(messages):
+    return "".join(fake_stream(messages))
+
+
+def fake_stream(messages):
+    context = messages[1]["content"].split("\n", 2)
+    line = context[1].lstrip("- ") if len(context) > 1 else ""
+    for i, word in enumerate(line.split()):
+        yield word if i == 0 else " " + word
+
+
+# FAQ_MODEL_BACKEND=fake lets the assistant run (and be tested) without network access.
+FAQ_MODEL_BACKENDS = {
+    "openai": (openai_complete, openai_stream),
+    "fake": (fake_complete, fake_stream),
+}
+faq_complete, faq_stream = FAQ_MODEL_BACKENDS.get(os.getenv("FAQ_MODEL_BACKEND", "openai"), FAQ_MODEL_BACKENDS["openai"])
+
+
+# Streaming is opt-in: old clients keep getting the JSON body.
+def wants_event_stream(data):
+    return data.get("stream") is True or "text/event-stream" in request.headers.get("Accept", "")
+
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+def sse_response(events):
+    response = app.response_class(events, mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # Stop nginx-style proxies from buffering the whole stream.
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+def faq_answer_response(answer, stream):
+    if stream:
+        return sse_response(iter([sse_event("token", {"text": answer}), sse_event("done", {"answer": answer})]))
+    # Return both keys so newer clients get a consistent message field without breaking older consumers.
+    return jsonify({"message": answer, "answer": answer}), 200
+
+
+def stream_faq_answer(tokens, cache_key):
+    parts = []
+    try:
+        for text in tokens:
+            parts.append(text)
+            yield sse_event("token", {"text": text})
+    except Exception as e:
+        print("FAQ stream error:", e)
+        yield sse_event("error", {"error": "Unable to reply right now."})
+        return
+    finally:
+        # Also runs on GeneratorExit when the client disconnects, so the upstream stream is dropped too.
+        close = getattr(tokens, "close", None)
+        if close:
+            close()
+
+    answer = "".join(parts)
+    if answer:
+        faq_answer_cache.set(cache_key, answer)
+    yield sse_event("done", {"answer": answer})
+
 
 @app.post("/api/faq")
+@rate_limited(faq_rate_limiter)
 def faq():
     data = request.get_json() or {}
     user_input = data.get("query", "").strip()
-    return faq_internal(user_input)
+    return faq_internal(user_input, stream=wants_event_stream(data))
     
-def faq_internal(user_input):
+def faq_internal(user_input, stream=False):
     if not user_input:
         return jsonify({"error": "No query entered"}), 400
     
-    faq_context = load_faq_text()
+    faq_text, faq_version = load_faq()
     
-    if not faq_context:
-        return jsonify({"message": "No FAQ information is currently available", "answer": "No FAQ information is currently available"}), 200
+    if not faq_text:
+        return faq_answer_response("No FAQ information is currently available", stream)
     
+    cache_key = (faq_version, normalize_query(user_input))
+    answer = faq_answer_cache.get(cache_key)
+    if answer is not None:
+        return faq_answer_response(answer, stream)
     
-    response = openai_client.chat.completions.create(
-        model = "gpt-4o-mini",
-        messages=[
-            {
-                "role": "system",
-                "content" : ("You are a helpful salon assistant. "
-                                "Answer the user's question using ONLY the FAQ information provided. "
-                                "Be friendly and concise. "
-                                "If the answer is not in the FAQ, say you are not sure and suggest contacting the salon.")
-                },
-            {
-                "role":"system",
-                "content":f"FAQ INFORMATION: \n{faq_context}"
-            },
-            {
-                "role":"user",
-                "content": user_input
-            }
-        ],
-        temperature=0.3,
-        max_tokens=250
-    )
+    faq_index = load_faq_index()
+    hits = faq_index.search(user_input, k=FAQ_TOP_K) if faq_index else []
+    
+    # A bullet that clearly answers the question is returned as-is, no model call needed.
+    direct = faq_index.confident_match(hits) if (faq_index and FAQ_DIRECT_ANSWERS) else None
+    if direct:
+        answer = direct["text"]
+        faq_answer_cache.set(cache_key, answer)
+        return faq_answer_response(answer, stream)
+    
+    # Only the relevant chunks go into the prompt; if nothing matched, the whole FAQ is still small enough to send.
+    faq_context = format_chunks(hits) if hits else faq_text
+    messages = build_faq_messages(user_input, faq_context)
+    
+    # Only requests that actually reach the model take an llm slot; cached and direct answers above never do.
+    llm = bulkheads["llm"]
+    held = False
+    try:
+        llm.acquire()
+        held = True
+        if stream:
+            response = sse_response(stream_faq_answer(openai_upstream.call(faq_stream, messages), cache_key))
+            # The stream keeps the slot until it finishes or the client goes away.
+            response.call_on_close(llm.release)
+            held = False
+            return response
+        answer = openai_upstream.call(faq_complete, messages)
+    except (UpstreamUnavailable, LimitExceeded) as e:
+        print("FAQ upstream error:", e)
+        # Degrade to the best FAQ line we found rather than failing outright; it is not cached.
+        if hits:
+            return faq_answer_response(hits[0]["chunk"]["text"], stream)
+        response = jsonify({"error": "The assistant is busy right now. Please try again shortly or contact the salon."})
+        if isinstance(e, LimitExceeded):
+            response.headers["Retry-After"] = str(e.retry_after)
+        else:
+            response.headers["Retry-After"] = str(max(openai_upstream.breaker.retry_after(), 5))
+        return response, 503
+    except openai.OpenAIError as e:
+        # Rejected by the API (bad request, auth): not retried and not counted against the breaker.
+        print("FAQ model error:", e)
+        if hits:
+            return faq_answer_response(hits[0]["chunk"]["text"], stream)
+        return jsonify({"error": "The assistant is unavailable right now. Please contact the salon."}), 502
+    finally:
+        if held:
+            llm.release()
 
-    answer = response.choices[0].message.content
-    # Return both keys so newer clients get a consistent message field without breaking older consumers.
-    return jsonify({"message": answer, "answer": answer}), 200
+    if answer:
+        faq_answer_cache.set(cache_key, answer)
+    return faq_answer_response(answer, stream)
 
 
 # Stateless assistant endpoint restored to FAQ-only behavior (no booking/session logic).
 @app.post("/api/assistant")
+@rate_limited(faq_rate_limiter)
 def assistant():
     data = request.get_json() or {}
     user_input = data.get("query", "").strip()
@@ -118,7 +684,7 @@ def assistant():
     if not user_input:
         return jsonify({"error": "No query entered"}), 400
     
-    return faq_internal(user_input)
+    return faq_internal(user_input, stream=wants_event_stream(data))
 
 
 # Simple helper that wraps jwt.encode so I don't repeat expiry logic.
@@ -196,19 +762,187 @@ def require_admin(fn):
     
     return wrapper
 
+# Page sizes for keyset-paginated lists.
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+# Cursors are opaque to clients: the sort key of the last row, JSON + base64.
+def encode_cursor(values):
+    raw = json.dumps([v.isoformat() if isinstance(v, (datetime.date, datetime.datetime)) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _cursor_time(value):
+    # Kept as stored (bookings.time is text); just has to be a time of day.
+    if not isinstance(value, str) or parse_minutes(value) is None:
+        raise ValueError(value)
+    return value
+
+
+def _cursor_int(value):
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError(value)
+    return value
+
+
+# Parsers for each keyset column type; anything else in a cursor is a 400, not a Postgres error.
+CURSOR_TYPES = {
+    "timestamp": lambda value: datetime.datetime.fromisoformat(value),
+    "date": lambda value: datetime.date.fromisoformat(value),
+    "time": _cursor_time,
+    "int": _cursor_int,
+}
+
+
+def decode_cursor(cursor, types):
+    # types: e.g. ("date", "time", "int"); returns the parsed values, or None if the cursor doesn't match.
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(types):
+        return None
+    try:
+        return [CURSOR_TYPES[kind](value) for kind, value in zip(types, values)]
+    except (ValueError, TypeError):
+        return None
+
+
+def get_page_size():
+    try:
+        limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+# ---- request profiling ----
+# PROFILE_SAMPLE_RATE=0.01 profiles 1% of requests; admins can force one with "X-Profile: 1".
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+
+
+def request_is_admin():
+    token = get_bearer_token()
+    if not token:
+        return False
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+    except Exception:
+        return False
+    return bool(payload.get("is_admin", False))
+
+
+def record_profiled_query(sql, seconds):
+    profile = sampler.current()
+    if profile is not None:
+        profile.add_sql(sql, seconds)
+
+
+db.query_observers.append(record_profiled_query)
+
+
+@app.before_request
+def maybe_start_profile():
+    sampled = PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+    if not sampled and not (request.headers.get("X-Profile") == "1" and request_is_admin()):
+        return
+    route = request.url_rule.rule if request.url_rule else request.path
+    g.profile = sampler.start(f"{request.method} {route}")
+
+
+@app.after_request
+def tag_profiled_response(response):
+    profile = g.get("profile")
+    if profile is not None:
+        g.profile_status = response.status_code
+        response.headers["X-Profile-Id"] = profile.id
+    return response
+
+
+@app.teardown_request
+def finish_profile(exc):
+    if g.get("profile") is None:
+        return
+    profile = sampler.stop()
+    if profile is None:
+        return
+    try:
+        save_profile(profile, {
+            "method": request.method,
+            "path": request.path,
+            "status": g.get("profile_status", 500),
+            "error": repr(exc) if exc else None,
+        })
+    except Exception as e:
+        print("Profile save error:", e)
+
+
+@app.get("/api/admin/profiles")
+@require_admin
+def admin_list_profiles():
+    return jsonify({"profiles": list_profiles()[:100]}), 200
+
+
+# Download a saved profile: <name>.collapsed for flame graphs, <name>.json for SQL and timings.
+@app.get("/api/admin/profiles/<name>.<ext>")
+@require_admin
+def admin_get_profile(name, ext):
+    if ext not in ("collapsed", "json") or name not in list_profiles():
+        return jsonify({"error": "Profile not found"}), 404
+    return send_from_directory(os.path.abspath(PROFILE_DIR), f"{name}.{ext}",
+                               mimetype="application/json" if ext == "json" else "text/plain")
+
+
 @app.get("/api/admin/users")
 @require_admin
 def admin_get_users():
+    limit = get_page_size()
+    filters = []
+    values = []
+
+    search = request.args.get("q", "").strip()
+    if search:
+        # Escape LIKE wildcards so a "%" in the search box is matched literally.
+        pattern = "%" + re.sub(r"([\\%_])", r"\\\1", search) + "%"
+        filters.append("(name ILIKE %s OR email ILIKE %s)")
+        values.extend([pattern, pattern])
+
+    cursor = request.args.get("cursor", "").strip()
+    if cursor:
+        after = decode_cursor(cursor, ("timestamp", "int"))
+        if after is None:
+            return jsonify({"error": "Invalid cursor"}), 400
+        filters.append("(created_at, id) < (%s::timestamptz, %s)")
+        values.extend(after)
+
+    where = f"WHERE {' AND '.join(filters)}" if filters else ""
+    values.append(limit + 1)
+
     connection = get_db()
     cur = connection.cursor()
     
     
     try:
-        cur.execute("""
-                    SELECT id, name, email, created_at, is_admin
-                    FROM users
-                    ORDER BY created_at DESC;
-                    """)
+        # Page first, then count bookings for just that page in the same statement.
+        cur.execute(f"""
+                    SELECT u.id, u.name, u.email, u.created_at, u.is_admin,
+                           bc.booking_count
+                    FROM (
+                        SELECT id, name, email, created_at, is_admin
+                        FROM users
+                        {where}
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT %s
+                    ) u
+                    LEFT JOIN LATERAL (
+                        SELECT COUNT(*) AS booking_count
+                        FROM bookings b
+                        WHERE b.user_id = u.id
+                    ) bc ON TRUE
+                    ORDER BY u.created_at DESC, u.id DESC;
+                    """, tuple(values))
         users = cur.fetchall()
         
     except Exception:
@@ -217,34 +951,151 @@ def admin_get_users():
     
     
     connection.close()
-    return jsonify({"users": users}), 200
+
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        last = users[-1]
+        next_cursor = encode_cursor([last["created_at"], last["id"]])
+
+    return jsonify({"users": users, "next_cursor": next_cursor}), 200
+
+
+# Prometheus scrape endpoint. Set METRICS_TOKEN to require "Authorization: Bearer <token>".
+@app.get("/metrics")
+def prometheus_metrics():
+    metrics_token = os.getenv("METRICS_TOKEN")
+    if metrics_token and get_auth_header() != f"Bearer {metrics_token}":
+        return jsonify({"error": "Unauthorized"}), 401
+    return app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.get("/api/admin/db-pool")
+@require_admin
+def admin_db_pool_stats():
+    return jsonify({"pool": pool_stats()}), 200
+
+
+@app.get("/api/admin/cache-stats")
+@require_admin
+def admin_cache_stats():
+    return jsonify({
+        "availability": availability_cache.stats(),
+        "faq_answers": faq_answer_cache.stats(),
+        "services_catalog_version": services_catalog["version"],
+        "listener_connected": notify_listener.connected
+    }), 200
+
+
+@app.get("/api/admin/upstreams")
+@require_admin
+def admin_upstream_stats():
+    return jsonify({
+        "openai": openai_upstream.stats(),
+        "stripe": stripe_upstream.stats(),
+        "password_hasher": password_hasher.stats()
+    }), 200
+
+
+@app.get("/api/admin/limits")
+@require_admin
+def admin_limit_stats():
+    return jsonify({
+        "bulkheads": {name: limit.stats() for name, limit in bulkheads.items()},
+        "rate_limits": {faq_rate_limiter.name: faq_rate_limiter.stats()}
+    }), 200
 
 
+# Shared by the paged admin list and the export: returns ((sql, values), err, status).
+# With a limit the query is one page (cursor-aware, one extra row to detect the next page).
+def build_admin_bookings_query(args, limit=None):
+    filters = []
+    values = []
+
+    try:
+        date_from = args.get("date_from", "").strip()
+        if date_from:
+            filters.append("b.date >= %s")
+            values.append(datetime.date.fromisoformat(date_from))
+
+        date_to = args.get("date_to", "").strip()
+        if date_to:
+            filters.append("b.date <= %s")
+            values.append(datetime.date.fromisoformat(date_to))
+    except ValueError:
+        return None, {"error":"Invalid date format. Use YYYY-MM-DD"}, 400
+
+    service = args.get("service", "").strip()
+    if service:
+        filters.append("b.service = %s")
+        values.append(service)
+
+    payment_status = args.get("payment_status", "").strip()
+    if payment_status:
+        filters.append("b.payment_status = %s")
+        values.append(payment_status)
+
+    user_id = args.get("user_id", "").strip()
+    if user_id:
+        if not user_id.isdigit():
+            return None, {"error":"Invalid user_id"}, 400
+        filters.append("b.user_id = %s")
+        values.append(int(user_id))
+
+    user_email = args.get("user_email", "").strip().lower()
+    if user_email:
+        filters.append("u.email = %s")
+        values.append(user_email)
+
+    cursor = args.get("cursor", "").strip() if limit is not None else ""
+    if cursor:
+        after = decode_cursor(cursor, ("date", "time", "int"))
+        if after is None:
+            return None, {"error":"Invalid cursor"}, 400
+        # Row comparison lets Postgres seek straight to the next page on the (date, time, id) index.
+        filters.append("(b.date, b.time, b.id) > (%s::date, %s, %s)")
+        values.extend(after)
+
+    where = f"WHERE {' AND '.join(filters)}" if filters else ""
+    page = ""
+    if limit is not None:
+        page = "LIMIT %s"
+        values.append(limit + 1)
+
+    sql = f"""
+          SELECT
+              b.id,
+              b.user_id,
+              u.name AS user_name,
+              u.email AS user_email,
+              b.service,
+              b.date,
+              b.time,
+              b.notes,
+              b.payment_method,
+              b.payment_status,
+              b.created_at
+          FROM bookings b JOIN users u ON b.user_id = u.id
+          {where}
+          ORDER BY b.date ASC, b.time ASC, b.id ASC
+          {page};
+          """
+    return (sql, tuple(values)), None, None
 
 
 @app.get("/api/admin/bookings")
 @require_admin
 def admin_get_all_bookings():
+    limit = get_page_size()
+    query, err, status = build_admin_bookings_query(request.args, limit=limit)
+    if err:
+        return jsonify(err), status
+
     connection = get_db()
     cur = connection.cursor()
     
     try:
-        cur.execute("""
-                    SELECT
-                        b.id,
-                        b.user_id,
-                        u.name AS user_name,
-                        u.email AS user_email,
-                        b.service,
-                        b.date,
-                        b.time,
-                        b.notes,
-                        b.payment_method,
-                        b.payment_status,
-                        b.created_at
-                    FROM bookings b JOIN users u ON b.user_id = u.id
-                    ORDER BY b.date ASC, b.time ASC;
-                    """)
+        cur.execute(*query)
         
         bookings = cur.fetchall()
     except Exception:
@@ -252,7 +1103,93 @@ def admin_get_all_bookings():
         return jsonify({"error":"Failed to fetch bookings"}), 500
     
     connection.close()
-    return jsonify({"bookings": bookings}), 200
+
+    next_cursor = None
+    if len(bookings) > limit:
+        bookings = bookings[:limit]
+        last = bookings[-1]
+        next_cursor = encode_cursor([last["date"], last["time"], last["id"]])
+
+    return jsonify({"bookings": bookings, "next_cursor": next_cursor}), 200
+
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+EXPORT_COLUMNS = [
+    "id", "user_id", "user_name", "user_email", "service", "date", "time",
+    "notes", "payment_method", "payment_status", "created_at",
+]
+# Spreadsheets run cells starting with these as formulas.
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _export_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def _csv_cell(value):
+    # Client-typed text (notes, user_name) is prefixed with ' so it opens as text, not a formula.
+    value = _export_value(value)
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+# Monthly accounting export. Rows come off a server-side cursor in fixed batches
+# and are written out as they arrive, so memory stays flat however big the export is.
+# Takes the same filters as /api/admin/bookings, without paging.
+@app.get("/api/admin/bookings/export")
+@require_admin
+def admin_export_bookings():
+    export_format = request.args.get("format", "csv").strip().lower()
+    if export_format not in ("csv", "ndjson"):
+        return jsonify({"error": "Format must be csv or ndjson"}), 400
+
+    query, err, status = build_admin_bookings_query(request.args)
+    if err:
+        return jsonify(err), status
+
+    def generate():
+        connection = get_db()
+        try:
+            # A named cursor keeps the result set on the Postgres side; we pull one batch at a time.
+            cur = connection.cursor(name="bookings_export", cursor_factory=RealDictCursor)
+            cur.itersize = EXPORT_BATCH_SIZE
+            cur.execute(*query)
+
+            if export_format == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(EXPORT_COLUMNS)
+                yield buffer.getvalue()
+
+            while True:
+                rows = cur.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                if export_format == "csv":
+                    buffer = io.StringIO()
+                    writer = csv.writer(buffer)
+                    for row in rows:
+                        writer.writerow([_csv_cell(row[col]) for col in EXPORT_COLUMNS])
+                    yield buffer.getvalue()
+                else:
+                    yield "".join(
+                        json.dumps({col: _export_value(row[col]) for col in EXPORT_COLUMNS}) + "\n"
+                        for row in rows
+                    )
+            cur.close()
+        finally:
+            connection.close()
+
+    mimetype = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    filename = f"bookings-{datetime.date.today().isoformat()}.{export_format}"
+    # stream_with_context keeps the request (and its teardown) alive until the last batch is sent.
+    response = app.response_class(stream_with_context(generate()), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
 
 
 @app.delete("/api/admin/bookings/<int:booking_id>")
@@ -264,7 +1201,7 @@ def admin_delete_booking(booking_id):
     
     try:
         cur.execute("""
-                    SELECT id, date, time
+                    SELECT id, service, date, time
                     FROM bookings
                     WHERE id = %s;
                     """, (booking_id,))
@@ -295,10 +1232,13 @@ def admin_delete_booking(booking_id):
             connection.close()
             return jsonify({"error":"Cannot delete past bookings"}),400
         
+        lock_days(cur, service_days=[(row["service"], booking_date)])
         cur.execute("""
                     DELETE FROM bookings
                     WHERE id = %s;
                     """, (booking_id,))
+        refresh_day(cur, row["service"], booking_date)
+        notify_availability_change(cur, row["service"], booking_date)
         
         connection.commit()
         
@@ -308,6 +1248,7 @@ def admin_delete_booking(booking_id):
         return jsonify({"error":"Failed to delete booking"}), 500
     
     connection.close()
+    invalidate_availability(row["service"], booking_date)
     return jsonify({"success": True, 
                     "message":"Booking deleted by admin"}), 200
     
@@ -365,6 +1306,7 @@ def admin_create_service():
                      """, (name, price, duration, category))
         
         new_service = cur.fetchone()
+        notify_services_change(cur)
         connection.commit()
         
     except Exception:
@@ -374,6 +1316,7 @@ def admin_create_service():
     
     
     connection.close()
+    bump_services_version()
     return jsonify({"service": new_service}), 201
 
 
@@ -440,7 +1383,7 @@ def admin_update_service(service_id):
             connection.close()
             return jsonify({"error":"Service not found"}), 404
         
-        
+        notify_services_change(cur)
         connection.commit()
         
     except Exception:
@@ -449,6 +1392,7 @@ def admin_update_service(service_id):
         return jsonify({"error":"Unable to update service"}), 500
     
     connection.close()
+    bump_services_version()
     return jsonify({"service": updated_service}), 200
 
 
@@ -480,6 +1424,7 @@ def admin_delete_service(service_id):
                     """, (service_id,))
         
         updated = cur.fetchone()
+        notify_services_change(cur)
         connection.commit()
         
     except Exception:
@@ -489,6 +1434,7 @@ def admin_delete_service(service_id):
     
     
     connection.close()
+    bump_services_version()
     return jsonify({"service": updated}), 200
     
     
@@ -520,6 +1466,7 @@ def require_auth(f):
 
 # Basic registration endpoint that hashes the password and stores the user.
 @app.post("/api/register")
+@bulkhead("auth")
 def register_user():
 
     data = request.get_json() or {}
@@ -535,7 +1482,7 @@ def register_user():
     if not is_valid_email(email):
         return jsonify({"error": "Invalid or unsupported email domain"}), 400
     
-    password_hash = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode()
+    password_hash = password_hasher.hash_password(password)
     
     #start connection with data base
     connection = get_db()
@@ -578,6 +1525,7 @@ def register_user():
 
 # Login endpoint checks credentials and returns a fresh token.
 @app.post("/api/login")
+@bulkhead("auth")
 def login_user():
     data = request.get_json() or {}
 
@@ -604,15 +1552,30 @@ def login_user():
 
     stored_hash = user["password_hash"]
 
-    correct_password = bcrypt.checkpw(
-        password.encode("utf-8"),
-        stored_hash.encode("utf-8")
-    )
+    correct_password = password_hasher.check_password(password, stored_hash)
 
     if not correct_password:
         return jsonify({"error": "Invalid email or password"}), 401
 
-    token = create_token(user["id"], user["is_admin"])
+    # Hashes made at an older BCRYPT_ROUNDS get upgraded while we still have the plain password.
+    if password_hasher.needs_rehash(stored_hash):
+        try:
+            new_hash = password_hasher.hash_password(password)
+            connection = get_db()
+            cur = connection.cursor()
+            cur.execute("""
+                        UPDATE users
+                        SET password_hash = %s
+                        WHERE id = %s AND password_hash = %s;
+                        """, (new_hash, user["id"], stored_hash))
+            connection.commit()
+            connection.close()
+            password_hasher.record_rehash()
+        except Exception as e:
+            # Not worth failing the login over; we'll try again next time.
+            print("Password rehash error:", e)
+
+    token = create_token(user["id"], user["is_admin"])
 
     return jsonify({
         "token": token,
@@ -626,16 +1589,17 @@ def login_user():
     
 
 
-def create_booking_in_db(user_id, service, date_string, time_string, notes=None, payment_method='in_person'):
-    
-    service = (service or "").strip()
-    date_string = (date_string or "").strip()
-    time_string = (time_string or "").strip() 
+# Must match the unique index name created in init_db.py.
+BOOKING_USER_SLOT_INDEX = "bookings_user_slot_key"
+
+
+# Shared input cleanup for single and batch bookings: returns (fields, err, status).
+def clean_booking_input(service, date_string, time_string, notes=None):
+    service = (service or "").strip() if isinstance(service, str) else ""
+    date_string = (date_string or "").strip() if isinstance(date_string, str) else ""
+    time_string = (time_string or "").strip() if isinstance(time_string, str) else ""
     notes = notes.strip() if isinstance(notes, str) and notes.strip() else None
     
-    if payment_method not in ("in_person", "online"):
-        payment_method = "in_person"
-    
     if not service:
         return None, {"error":"Missing service"}, 400
     if not date_string:
@@ -647,41 +1611,133 @@ def create_booking_in_db(user_id, service, date_string, time_string, notes=None,
         booking_date = datetime.date.fromisoformat(date_string)
     except ValueError:
         return None, {"error":"Invalid date format. Use YYYY-MM-DD"}, 400
+    if not is_open(booking_date):
+        return None, {"error": "We're closed on Sundays"}, 400
+    
+    duration = service_durations().get(service)
+    if duration is None:
+        return None, {"error": f"Unknown service: {service}"}, 400
+    interval = booking_interval(time_string, duration)
+    if interval is None:
+        return None, {"error": "Invalid time format. Use HH:MM"}, 400
+    if interval[0] < DAY_START:
+        return None, {"error": f"We open at {format_minutes(DAY_START)}"}, 400
+    # Off-grid starts would make the slot bitmaps (and so /api/availability) disagree with conflict checks.
+    if not is_slot_start(interval[0]):
+        return None, {"error": "Bookings start on the hour"}, 400
+    if interval[1] > DAY_END:
+        return None, {"error": "This service would run past closing time"}, 400
+    
+    # Stored as HH:MM so "9:00" and "09:00" are the same slot.
+    return {"service": service, "date": booking_date, "time": format_minutes(interval[0]), "notes": notes,
+            "duration": duration, "start": interval[0], "end": interval[1]}, None, None
+
+
+# Bookings on the same days as the request, as interval indexes: one per service-day
+# and one per day for this user. Conflict checks for single and batch bookings go through these.
+def load_day_indexes(cur, user_id, service_days):
+    cur.execute("""
+                SELECT id, user_id, service, date, time, duration
+                FROM bookings
+                WHERE (service, date) IN (SELECT * FROM unnest(%s::text[], %s::date[]))
+                   OR (user_id = %s AND date = ANY(%s::date[]));
+                """, ([s for s, _ in service_days], [d for _, d in service_days],
+                      user_id, list({d for _, d in service_days})))
+    wanted = set(service_days)
+    intervals = {}
+    for row in cur.fetchall():
+        interval = booking_interval(row["time"], row["duration"])
+        if interval is None:
+            continue
+        if (row["service"], row["date"]) in wanted:
+            intervals.setdefault(("service", row["service"], row["date"]), []).append((*interval, row["id"]))
+        if row["user_id"] == user_id:
+            intervals.setdefault(("user", row["date"]), []).append((*interval, row["id"]))
+    return {key: IntervalIndex(items) for key, items in intervals.items()}
+
+
+def booking_clash(indexes, fields):
+    # A taken service slot is the more useful message, so it wins over a user clash.
+    service_day = indexes.get(("service", fields["service"], fields["date"]))
+    if service_day is not None and service_day.overlaps(fields["start"], fields["end"]):
+        return "This service is already booked at that time"
+    user_day = indexes.get(("user", fields["date"]))
+    if user_day is not None and user_day.overlaps(fields["start"], fields["end"]):
+        return "You already have a booking at this time"
+    return None
+
+
+def add_to_day_indexes(indexes, fields):
+    for key in (("service", fields["service"], fields["date"]), ("user", fields["date"])):
+        indexes.setdefault(key, IntervalIndex()).add(fields["start"], fields["end"])
+
+
+def create_booking_in_db(user_id, service, date_string, time_string, notes=None, payment_method='in_person'):
+    
+    if payment_method not in ("in_person", "online"):
+        payment_method = "in_person"
+    
+    fields, err, status = clean_booking_input(service, date_string, time_string, notes)
+    if err:
+        return None, err, status
+    service = fields["service"]
+    booking_date = fields["date"]
+    time_string = fields["time"]
+    notes = fields["notes"]
+    duration = fields["duration"]
     
     connection = get_db()
     cur = connection.cursor(cursor_factory=RealDictCursor)
     
     try:
-        # service conflict handling
-        cur.execute("""
-                    SELECT id FROM bookings
-                    WHERE date = %s AND time = %s AND service = %s;
-                    """, (booking_date, time_string, service))
-        if cur.fetchone():
+        # Overlap by duration can't be a unique index, so hold this service-day and
+        # user-day while checking the day's intervals and inserting.
+        lock_days(cur, service_days=[(service, booking_date)], user_days=[(user_id, booking_date)])
+        clash = booking_clash(load_day_indexes(cur, user_id, [(service, booking_date)]), fields)
+        if clash:
+            connection.rollback()
             connection.close()
-            return None, {"error":"This service is already booked at that time"}, 409
-        
+            return None, {"error": clash}, 409
         
-        # user conflict handling
+        # The unique indexes from init_db.py stay as a backstop for exact-slot clashes:
+        # a taken service slot hits ON CONFLICT and returns no row; a user clash raises.
+        # The occupancy bits are set only if the booking row went in, and the pg_notify
+        # rides along in the same batch; both are discarded if we roll back.
         cur.execute("""
-            SELECT id FROM bookings
-            WHERE date = %s AND time = %s AND user_id = %s;
-        """, (booking_date, time_string, user_id))
-        if cur.fetchone():
-            connection.close()
-            return None, {"error": "You already have a booking at this time"}, 409
-
-        # create booking 
-        cur.execute("""
-            INSERT INTO bookings (user_id, service, date, time, notes, payment_method, payment_status)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            RETURNING id, user_id, service, date, time, notes, payment_method, payment_status, created_at;
-        """, (user_id, service, booking_date, time_string, notes, payment_method, 'pending'))
+            SELECT pg_notify(%s, %s);
+            WITH inserted AS (
+                INSERT INTO bookings (user_id, service, date, time, duration, notes, payment_method, payment_status)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (service, date, time) DO NOTHING
+                RETURNING id, user_id, service, date, time, duration, notes, payment_method, payment_status, created_at
+            ), occupied AS (
+                INSERT INTO slot_occupancy (service, date, booked_mask)
+                SELECT service, date, %s FROM inserted WHERE %s <> 0
+                ON CONFLICT (service, date) DO UPDATE
+                SET booked_mask = slot_occupancy.booked_mask | EXCLUDED.booked_mask
+            )
+            SELECT * FROM inserted;
+        """, (AVAILABILITY_CHANNEL, f"{booking_date.isoformat()}|{service}",
+              user_id, service, booking_date, time_string, duration, notes, payment_method, 'pending',
+              booking_mask(time_string, duration), booking_mask(time_string, duration)))
 
         booking = cur.fetchone()
+        if booking is None:
+            connection.rollback()
+            connection.close()
+            return None, {"error":"This service is already booked at that time"}, 409
+
         connection.commit()
         connection.close()
+        invalidate_availability(service, booking_date)
         return booking, None, 201
+
+    except psycopg2.errors.UniqueViolation as e:
+        connection.rollback()
+        connection.close()
+        if e.diag.constraint_name == BOOKING_USER_SLOT_INDEX:
+            return None, {"error": "You already have a booking at this time"}, 409
+        return None, {"error":"This service is already booked at that time"}, 409
         
     except Exception as e:
         connection.rollback()
@@ -712,44 +1768,136 @@ def book_appointment(user_id):
     return jsonify({"booking": booking}), 201
     
     
-# Availability endpoint is public so the frontend can show slots.
-@app.get("/api/availability")
-def get_availability():
-    service =request.args.get("service", "").strip()
-    date_string = request.args.get("date","").strip()
+MAX_BATCH_BOOKINGS = 10
+
+
+# Books several services in one go (e.g. cut + colour + treatment): one conflict query,
+# one multi-row INSERT, one commit. Either every item is booked or none are.
+def create_bookings_batch_in_db(user_id, items, payment_method='in_person'):
     
-    if not service or not date_string:
-        return jsonify({"error":"Missing service or date"}), 400
+    if payment_method not in ("in_person", "online"):
+        payment_method = "in_person"
     
-    try:
-        date_main = datetime.date.fromisoformat(date_string)
-    except ValueError:
-        return jsonify({"error":"Invalid date format. Use YYYY-MM-DD"}), 400
+    if not isinstance(items, list) or not items:
+        return None, {"error": "Missing items"}, 400
+    if len(items) > MAX_BATCH_BOOKINGS:
+        return None, {"error": f"A batch is limited to {MAX_BATCH_BOOKINGS} bookings"}, 400
+    
+    results = []
+    cleaned = []
+    for item in items:
+        item = item if isinstance(item, dict) else {}
+        fields, err, status = clean_booking_input(item.get("service"), item.get("date"), item.get("time"), item.get("notes"))
+        results.append({"status": status, **err} if err else {"status": None})
+        cleaned.append(fields)
+    
+    if any(r["status"] for r in results):
+        for r in results:
+            if not r["status"]:
+                r.update({"status": 424, "error": "Not booked because another item failed"})
+        return None, {"error": "Some bookings could not be made", "results": results}, 400
+    
+    services = [f["service"] for f in cleaned]
+    dates = [f["date"] for f in cleaned]
+    times = [f["time"] for f in cleaned]
+    durations = [f["duration"] for f in cleaned]
+    notes = [f["notes"] for f in cleaned]
+    service_days = list(dict.fromkeys(zip(services, dates)))
     
     connection = get_db()
     cur = connection.cursor()
     
+    try:
+        lock_days(cur, service_days=service_days, user_days=[(user_id, d) for d in set(dates)])
+        indexes = load_day_indexes(cur, user_id, service_days)
+        
+        # Items are checked in order against existing bookings and the items before them,
+        # which also catches clashes inside the batch itself.
+        for i, fields in enumerate(cleaned):
+            clash = booking_clash(indexes, fields)
+            if clash:
+                results[i] = {"status": 409, "error": clash}
+            else:
+                add_to_day_indexes(indexes, fields)
+        
+        if any(r["status"] for r in results):
+            connection.rollback()
+            connection.close()
+            for r in results:
+                if not r["status"]:
+                    r.update({"status": 424, "error": "Not booked because another item failed"})
+            return None, {"error": "Some bookings could not be made", "results": results}, 409
+        
+        cur.execute("""
+                    INSERT INTO bookings (user_id, service, date, time, duration, notes, payment_method, payment_status)
+                    SELECT %s, x.service, x.date, x.time, x.duration, x.notes, %s, 'pending'
+                    FROM unnest(%s::text[], %s::date[], %s::text[], %s::int[], %s::text[])
+                        AS x(service, date, time, duration, notes)
+                    RETURNING id, user_id, service, date, time, duration, notes, payment_method, payment_status, created_at;
+                    """, (user_id, payment_method, services, dates, times, durations, notes))
+        inserted = {(row["service"], row["date"], row["time"]): row for row in cur.fetchall()}
+        mark_booked(cur, [(row["service"], row["date"], row["time"], row["duration"]) for row in inserted.values()])
+        
+        for service_name, booking_date in {(f["service"], f["date"]) for f in cleaned}:
+            notify_availability_change(cur, service_name, booking_date)
+        connection.commit()
+        connection.close()
+        
+    except psycopg2.errors.UniqueViolation:
+        # Lost a race with another request between the check and the insert.
+        connection.rollback()
+        connection.close()
+        return None, {"error": "One or more of these slots was just booked. Please pick again."}, 409
+        
+    except Exception as e:
+        connection.rollback()
+        connection.close()
+        print("Batch booking error:", e)
+        return None, {"error": "Failed to create bookings"}, 500
+    
+    for service_name, booking_date in {(f["service"], f["date"]) for f in cleaned}:
+        invalidate_availability(service_name, booking_date)
     
-    cur.execute("""
-                SELECT time
-                FROM bookings
-                WHERE service = %s AND date = %s;
-                """, (service, date_main))
-    booked_slots = {row["time"] for row in cur.fetchall()}
-    connection.close()
+    results = [
+        {"status": 201, "booking": inserted[(f["service"], f["date"], f["time"])]}
+        for f in cleaned
+    ]
+    return results, None, 201
+
+
+@app.post("/api/book/batch")
+@require_auth
+def book_appointments_batch(user_id):
+    data = request.get_json() or {}
+    
+    results, err, status = create_bookings_batch_in_db(
+        user_id=user_id,
+        items=data.get("items"),
+        payment_method=data.get("payment_method", "in_person")
+    )
+    
+    if err:
+        return jsonify(err), status
+    
+    return jsonify({"results": results, "bookings": [r["booking"] for r in results]}), 201
     
+    
+# Shared slot rules so the single-day and matrix endpoints can't drift apart.
+def build_slot_map(date_main, booked_mask, now, duration=DEFAULT_DURATION):
     slots = {}
+    # Closed days have no free slots at all. Otherwise a start is free when a booking
+    # of this length fits in one of the day's free gaps (so it neither overlaps one
+    # already made nor runs past closing).
+    fits = set(free_starts(mask_index(booked_mask), duration or DEFAULT_DURATION)) if is_open(date_main) else set()
     # I build a map of time => availability so the frontend can keep its UI simple.
-    now = datetime.datetime.now()
-
     for slot in TIME_SLOTS:
         # slot: "14:00"
         slot_hour, slot_minute = map(int, slot.split(":"))
 
         slot_dt = datetime.datetime.combine(date_main, datetime.time(slot_hour, slot_minute))
 
-        # Rule 1: slot already booked (existing logic)
-        if slot in booked_slots:
+        # Rule 1: no gap here is long enough for this service
+        if parse_minutes(slot) not in fits:
             slots[slot] = False
             continue
 
@@ -760,6 +1908,27 @@ def get_availability():
 
         # Otherwise available
         slots[slot] = True
+
+    return slots
+
+
+# Availability endpoint is public so the frontend can show slots.
+@app.get("/api/availability")
+def get_availability():
+    service =request.args.get("service", "").strip()
+    date_string = request.args.get("date","").strip()
+    
+    if not service or not date_string:
+        return jsonify({"error":"Missing service or date"}), 400
+    
+    try:
+        date_main = datetime.date.fromisoformat(date_string)
+    except ValueError:
+        return jsonify({"error":"Invalid date format. Use YYYY-MM-DD"}), 400
+    
+    booked_mask = get_booked_mask(service, date_main)
+    
+    slots = build_slot_map(date_main, booked_mask, datetime.datetime.now(), service_duration(service))
         
     return jsonify({
         "service": service,
@@ -768,8 +1937,238 @@ def get_availability():
     })
 
 
-@app.get("/api/services")
-def list_services():
+# Whole grid (services x days) in one query so week views and the admin day view skip the per-slot polling.
+@app.get("/api/availability/matrix")
+def get_availability_matrix():
+    start_string = request.args.get("start", "").strip()
+    end_string = request.args.get("end", "").strip() or start_string
+
+    if not start_string:
+        return jsonify({"error": "Missing start date"}), 400
+
+    try:
+        start_date = datetime.date.fromisoformat(start_string)
+        end_date = datetime.date.fromisoformat(end_string)
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
+
+    if end_date < start_date:
+        return jsonify({"error": "End date must not be before start date"}), 400
+
+    if (end_date - start_date).days + 1 > MAX_AVAILABILITY_DAYS:
+        return jsonify({"error": f"Date range is limited to {MAX_AVAILABILITY_DAYS} days"}), 400
+
+    # Accept ?services=a,b as well as repeated ?service=a&service=b.
+    services = [s.strip() for s in request.args.getlist("service") if s.strip()]
+    for chunk in request.args.getlist("services"):
+        services.extend(s.strip() for s in chunk.split(",") if s.strip())
+    services = list(dict.fromkeys(services))
+
+    connection = get_db()
+    cur = connection.cursor()
+
+    try:
+        if services:
+            cur.execute("""
+                        SELECT s.name AS service, o.date, o.booked_mask
+                        FROM unnest(%s::text[]) AS s(name)
+                        LEFT JOIN slot_occupancy o
+                            ON o.service = s.name AND o.date BETWEEN %s AND %s;
+                        """, (services, start_date, end_date))
+        else:
+            cur.execute("""
+                        SELECT s.name AS service, o.date, o.booked_mask
+                        FROM services s
+                        LEFT JOIN slot_occupancy o
+                            ON o.service = s.name AND o.date BETWEEN %s AND %s
+                        WHERE s.is_active = TRUE;
+                        """, (start_date, end_date))
+        rows = cur.fetchall()
+    except Exception:
+        connection.close()
+        return jsonify({"error": "Failed to fetch availability"}), 500
+
+    connection.close()
+
+    booked = {}
+    for row in rows:
+        taken = booked.setdefault(row["service"], {})
+        if row["date"] is not None:
+            taken[row["date"]] = row["booked_mask"]
+
+    now = datetime.datetime.now()
+    days = [start_date + datetime.timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+
+    availability = {}
+    for service_name in (services or sorted(booked)):
+        taken = booked.get(service_name, {})
+        duration = service_duration(service_name)
+        availability[service_name] = {
+            day.isoformat(): build_slot_map(day, taken.get(day, 0), now, duration)
+            for day in days
+        }
+
+    return jsonify({
+        "start": start_date.isoformat(),
+        "end": end_date.isoformat(),
+        "time_slots": TIME_SLOTS,
+        "availability": availability
+    })
+
+
+# Push instead of polling: one SSE stream per page, any number of (service, date) channels.
+# Idle streams cost the hub a queue each, not a thread. In production they're served by
+# a separate gevent process (gunicorn -c gunicorn_live.conf.py), where thousands of open
+# streams are just greenlets, fed by the same NOTIFY channel as everything else.
+# Under gthread workers each stream would hold a request thread, so there they run under
+# their own bulkhead ("live") and a full process answers 503 + Retry-After.
+# Clients fall back to the availability they fetched and close streams for hidden tabs.
+LIVE_MAX_CHANNELS = 14
+LIVE_HEARTBEAT_SECONDS = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+# Streams end after this and EventSource reconnects, so no request is pinned forever.
+LIVE_MAX_SECONDS = float(os.getenv("LIVE_MAX_SECONDS", "300"))
+
+
+def live_event(kind, key, slots):
+    service, date_main = key
+    return sse_event(kind, {"service": service, "date": date_main.isoformat(), "slots": slots})
+
+
+@app.get("/api/availability/live")
+@thread_bulkhead("live")
+def availability_live():
+    # ?service=a,b&date=2026-01-02,2026-01-03 subscribes to every (service, date) pair.
+    services = []
+    for chunk in request.args.getlist("service"):
+        services.extend(s.strip() for s in chunk.split(",") if s.strip())
+    dates = []
+    try:
+        for chunk in request.args.getlist("date"):
+            dates.extend(datetime.date.fromisoformat(d.strip()) for d in chunk.split(",") if d.strip())
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
+    if not services or not dates:
+        return jsonify({"error": "Missing service or date"}), 400
+
+    keys = list(dict.fromkeys((service, day) for service in services for day in dates))
+    if len(keys) > LIVE_MAX_CHANNELS:
+        return jsonify({"error": f"A stream is limited to {LIVE_MAX_CHANNELS} service/date pairs"}), 400
+
+    notify_listener.ensure_started()
+    subscription, states = availability_hub.subscribe(keys)
+    if subscription is None:
+        metrics.inc("live_rejected_total")
+        response = jsonify({"error": "Too many live connections, please retry shortly"})
+        response.headers["Retry-After"] = "5"
+        return response, 503
+
+    def events():
+        try:
+            yield "retry: 3000\n\n"
+            for key in keys:
+                yield live_event("snapshot", key, states[key])
+
+            deadline = time.monotonic() + LIVE_MAX_SECONDS
+            while time.monotonic() < deadline:
+                pending, lagged = subscription.wait(LIVE_HEARTBEAT_SECONDS)
+                if lagged:
+                    for key in keys:
+                        yield live_event("snapshot", key, availability_hub.current(key))
+                    continue
+                if not pending:
+                    # Comment line: keeps proxies from closing an idle stream.
+                    yield ": keepalive\n\n"
+                    continue
+                for kind, key, slots in pending:
+                    yield live_event(kind, key, slots)
+        finally:
+            # Runs when the client goes away (the server closes the generator) or the stream times out.
+            availability_hub.unsubscribe(subscription)
+
+    return sse_response(events())
+
+
+# "When's the soonest I can get X?" without the client polling day by day.
+NEXT_SLOTS_DEFAULT = 5
+NEXT_SLOTS_MAX = 50
+NEXT_SLOTS_MAX_DAYS = 90
+
+
+@app.get("/api/availability/next")
+def get_next_available():
+    # Accept ?services=a,b as well as repeated ?service=a&service=b; none means every active service.
+    services = [s.strip() for s in request.args.getlist("service") if s.strip()]
+    for chunk in request.args.getlist("services"):
+        services.extend(s.strip() for s in chunk.split(",") if s.strip())
+    services = list(dict.fromkeys(services))
+
+    try:
+        count = int(request.args.get("count", NEXT_SLOTS_DEFAULT))
+        days = int(request.args.get("days", NEXT_SLOTS_MAX_DAYS))
+    except ValueError:
+        return jsonify({"error": "count and days must be integers"}), 400
+    if not 1 <= count <= NEXT_SLOTS_MAX:
+        return jsonify({"error": f"count must be between 1 and {NEXT_SLOTS_MAX}"}), 400
+    if not 1 <= days <= NEXT_SLOTS_MAX_DAYS:
+        return jsonify({"error": f"days must be between 1 and {NEXT_SLOTS_MAX_DAYS}"}), 400
+
+    now = datetime.datetime.now()
+    try:
+        start_date = datetime.date.fromisoformat(request.args.get("from", "").strip() or now.date().isoformat())
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
+    start_date = max(start_date, now.date())
+    end_date = start_date + datetime.timedelta(days=days - 1)
+
+    # Optional time-of-day window: start no earlier than ?after=, finish by ?before=.
+    after = parse_minutes(request.args.get("after", "").strip() or format_minutes(DAY_START))
+    before = parse_minutes(request.args.get("before", "").strip() or format_minutes(DAY_END))
+    if after is None or before is None:
+        return jsonify({"error": "Invalid time format. Use HH:MM"}), 400
+
+    weekdays = None
+    if request.args.get("weekdays", "").strip():
+        names = [w.strip().lower()[:3] for w in request.args["weekdays"].split(",") if w.strip()]
+        if any(name not in WEEKDAY_NAMES for name in names):
+            return jsonify({"error": "weekdays must be names like mon,tue,sat"}), 400
+        weekdays = {WEEKDAY_NAMES.index(name) for name in names}
+
+    catalog = service_durations()
+    unknown = [name for name in services if name not in catalog]
+    if unknown:
+        return jsonify({"error": f"Unknown service: {', '.join(unknown)}"}), 400
+    durations = {name: catalog[name] for name in services} if services else dict(sorted(catalog.items()))
+    if not durations:
+        return jsonify({"slots": [], "start": start_date.isoformat(), "end": end_date.isoformat()})
+
+    connection = get_db()
+    cur = connection.cursor()
+    try:
+        # One range scan on bookings_service_slot_key (service, date, time) for the whole horizon.
+        cur.execute("""
+                    SELECT service, date, time, duration
+                    FROM bookings
+                    WHERE service = ANY(%s) AND date BETWEEN %s AND %s;
+                    """, (list(durations), start_date, end_date))
+        rows = cur.fetchall()
+    except Exception:
+        connection.close()
+        return jsonify({"error": "Failed to fetch availability"}), 500
+    connection.close()
+
+    intervals = {}
+    for row in rows:
+        interval = booking_interval(row["time"], row["duration"])
+        if interval is not None:
+            intervals.setdefault((row["service"], row["date"]), []).append((*interval, None))
+    indexes = {key: IntervalIndex(items) for key, items in intervals.items()}
+
+    slots = earliest_free(indexes, durations, start_date, end_date, now, count,
+                          after=after, before=before, weekdays=weekdays)
+    return jsonify({"slots": slots, "start": start_date.isoformat(), "end": end_date.isoformat()})
+
+
+def load_services_catalog():
     connection = get_db()
     cur = connection.cursor()
     try:
@@ -782,77 +2181,216 @@ def list_services():
             """
         )
         rows = cur.fetchall()
-        services = []
-        for row in rows:
-            services.append({
-                "id": row.get("id"),
-                "name": row.get("name"),
-                "price": str(row.get("price")) if row.get("price") is not None else None,
-                "duration": row.get("duration"),
-                "category": row.get("category") or "",
-                "is_active": row.get("is_active", True),
-            })
-        return jsonify({"services": services})
-    except Exception:
-        connection.rollback()
-        return jsonify({"error": "Failed to load services"}), 500
     finally:
         connection.close()
+
+    services = []
+    for row in rows:
+        services.append({
+            "id": row.get("id"),
+            "name": row.get("name"),
+            "price": str(row.get("price")) if row.get("price") is not None else None,
+            "duration": row.get("duration"),
+            "category": row.get("category") or "",
+            "is_active": row.get("is_active", True),
+        })
+    return services
+
+
+def get_services_snapshot():
+    notify_listener.ensure_started()
+    with services_catalog_lock:
+        version = services_catalog["version"]
+        # Only trust the snapshot while the listener can tell us about other workers' edits.
+        if notify_listener.connected and services_catalog["built_version"] == version:
+            return services_catalog["body"], services_catalog["etag"]
+
+    body = json.dumps({"services": load_services_catalog()}, separators=(",", ":")).encode("utf-8")
+    # ETag comes from the content so every worker hands out the same tag for the same catalog.
+    etag = hashlib.sha1(body).hexdigest()
+
+    with services_catalog_lock:
+        # A bump that landed while we were querying wins; the next read rebuilds again.
+        if services_catalog["version"] == version:
+            services_catalog["built_version"] = version
+            services_catalog["body"] = body
+            services_catalog["etag"] = etag
+    return body, etag
+
+
+def service_durations():
+    # {name: minutes} for every active service, rebuilt only when the catalog changes.
+    body, etag = get_services_snapshot()
+    with services_catalog_lock:
+        durations = services_catalog["durations"]
+    if durations is None or durations[0] != etag:
+        # Legacy rows without a duration still count as services, one slot long.
+        durations = (etag, {
+            service["name"]: service.get("duration") or DEFAULT_DURATION
+            for service in json.loads(body)["services"]
+        })
+        with services_catalog_lock:
+            services_catalog["durations"] = durations
+    return durations[1]
+
+
+def service_duration(name):
+    # Minutes a booking of this service occupies; names that aren't active
+    # services fall back to a single slot.
+    return service_durations().get(name, DEFAULT_DURATION)
+
+
+@app.get("/api/services")
+def list_services():
+    try:
+        body, etag = get_services_snapshot()
+    except Exception:
+        return jsonify({"error": "Failed to load services"}), 500
+
+    response = app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = f"public, max-age={SERVICES_MAX_AGE}, must-revalidate"
+    # make_conditional turns a matching If-None-Match into an empty 304.
+    return response.make_conditional(request)
     
     
     
 # Authenticated endpoint so each user can review their own bookings.
+# Upcoming (soonest first) and past (latest first) are separate keyset-paged views.
+MY_BOOKINGS_VIEWS = ("upcoming", "past")
+
+
+def set_private_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Per-user data: browsers may keep it but must revalidate every time.
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
 @app.get("/api/my-bookings")
 @require_auth
 def get_my_bookings(user_id):
+    view = request.args.get("view", "upcoming").strip() or "upcoming"
+    if view not in MY_BOOKINGS_VIEWS:
+        return jsonify({"error": "view must be upcoming or past"}), 400
+    limit = get_page_size()
+    
+    filters = ["user_id = %s"]
+    values = [user_id]
+    
+    # Past/upcoming split is a row comparison against "now" so it stays on the
+    # (user_id, date, time) index; times are stored as zero-padded HH:MM.
+    now = datetime.datetime.now()
+    today, now_time = now.date(), now.strftime("%H:%M")
+    filters.append("(date, time) > (%s::date, %s)" if view == "upcoming" else "(date, time) <= (%s::date, %s)")
+    values.extend([today, now_time])
+    
+    on_date = request.args.get("date", "").strip()
+    if on_date:
+        try:
+            filters.append("date = %s")
+            values.append(datetime.date.fromisoformat(on_date))
+        except ValueError:
+            return jsonify({"error":"Invalid date format. Use YYYY-MM-DD"}), 400
+    
+    cursor = request.args.get("cursor", "").strip()
+    if cursor:
+        after = decode_cursor(cursor, ("date", "time"))
+        if after is None:
+            return jsonify({"error":"Invalid cursor"}), 400
+        # (date, time) is unique per user, so it is a complete keyset on its own.
+        filters.append("(date, time) > (%s::date, %s)" if view == "upcoming" else "(date, time) < (%s::date, %s)")
+        values.extend(after)
     
     connection = get_db()
     cur = connection.cursor()
     
-    cur.execute("""
-                SELECT id,
-                       service,
-                       date,
-                       time,
-                       notes,
-                       payment_method,
-                       payment_status,
-                       created_at,
-                       (
-                           date < CURRENT_DATE
-                           OR (date = CURRENT_DATE AND time::time <= CURRENT_TIME)
-                       ) AS is_past
-                FROM bookings
-                WHERE user_id = %s
-                ORDER BY date ASC, time ASC;
-                """, (user_id,))
+    try:
+        # Validators first: the user's change counter plus the next booking still to start.
+        # The latter changes as time moves a booking from upcoming to past, which no
+        # write would record. A match skips the page query and JSON entirely.
+        cur.execute("""
+                    SELECT u.bookings_version,
+                           u.bookings_changed_at,
+                           (SELECT b.date::text || ' ' || b.time
+                            FROM bookings b
+                            WHERE b.user_id = u.id AND (b.date, b.time) > (%s::date, %s)
+                            ORDER BY b.date ASC, b.time ASC
+                            LIMIT 1) AS next_start,
+                           (SELECT b.date::text || ' ' || b.time
+                            FROM bookings b
+                            WHERE b.user_id = u.id AND (b.date, b.time) <= (%s::date, %s)
+                            ORDER BY b.date DESC, b.time DESC
+                            LIMIT 1) AS last_start
+                    FROM users u
+                    WHERE u.id = %s;
+                    """, (today, now_time, today, now_time, user_id))
+        marker = cur.fetchone()
+        if marker is None:
+            connection.close()
+            return jsonify({"error": "User not found"}), 404
+        
+        etag = hashlib.sha1(
+            f'{user_id}|{marker["bookings_version"]}|{marker["next_start"]}|{view}|{on_date}|{cursor}|{limit}'.encode("utf-8")
+        ).hexdigest()
+        # Last-Modified also moves when a booking slips into the past.
+        last_modified = marker["bookings_changed_at"]
+        if marker["last_start"]:
+            try:
+                started = datetime.datetime.strptime(marker["last_start"], "%Y-%m-%d %H:%M").astimezone()
+                last_modified = max(last_modified, started)
+            except ValueError:
+                pass
+        
+        probe = set_private_validators(app.response_class(), etag, last_modified)
+        if probe.make_conditional(request).status_code == 304:
+            connection.close()
+            return probe
+        
+        order = "ASC" if view == "upcoming" else "DESC"
+        values.append(limit + 1)
+        cur.execute(f"""
+                    SELECT id,
+                           service,
+                           date,
+                           time,
+                           duration,
+                           notes,
+                           payment_method,
+                           payment_status,
+                           created_at
+                    FROM bookings
+                    WHERE {" AND ".join(filters)}
+                    ORDER BY date {order}, time {order}
+                    LIMIT %s;
+                    """, tuple(values))
+        bookings = cur.fetchall()
+    except Exception:
+        connection.close()
+        return jsonify({"error":"Failed to fetch bookings"}), 500
     
-    bookings = cur.fetchall()
     connection.close()
     
-    return jsonify({"bookings": bookings})
+    next_cursor = None
+    if len(bookings) > limit:
+        bookings = bookings[:limit]
+        next_cursor = encode_cursor([bookings[-1]["date"], bookings[-1]["time"]])
+    for booking in bookings:
+        booking["is_past"] = view == "past"
+    
+    response = jsonify({"view": view, "bookings": bookings, "next_cursor": next_cursor})
+    return set_private_validators(response, etag, last_modified)
 
 
 @app.delete("/api/bookings/<int:booking_id>")
-def delete_booking(booking_id):
-    try:
-        token = get_bearer_token()
-        if not token:
-            return jsonify({"error":"Missing or invalid token"}), 401
-
-        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-        user_id = payload.get("user_id")
-        if not user_id:
-            return jsonify({"error":"Invalid token payload"}), 401
-        
-    except Exception:
-        return jsonify({"error": "Authentication failed"}), 401
-
+@require_auth
+def delete_booking(user_id, booking_id):
     connection = get_db()
     cur = connection.cursor()
     
     cur.execute("""
-        SELECT id FROM bookings
+        SELECT id, service, date FROM bookings
         WHERE id = %s AND user_id = %s;
     """, (booking_id, user_id))
     
@@ -862,19 +2400,53 @@ def delete_booking(booking_id):
         return jsonify({"error": "Booking not found"}), 404
 
     # 4. Delete the booking
+    lock_days(cur, service_days=[(row["service"], row["date"])])
     cur.execute("""
         DELETE FROM bookings
         WHERE id = %s AND user_id = %s;
     """, (booking_id, user_id))
+    refresh_day(cur, row["service"], row["date"])
+    notify_availability_change(cur, row["service"], row["date"])
 
     connection.commit()
     connection.close()
+    invalidate_availability(row["service"], row["date"])
 
     return jsonify({"success": True, "message": "Booking cancelled."})
 
 
+def stripe_create_session(**params):
+    return stripe.checkout.Session.create(**params)
+
+
+# Offline stand-in for Stripe Checkout: sends the user straight to the success page.
+def fake_create_session(idempotency_key=None, **params):
+    session_id = f"cs_fake_{uuid.uuid4().hex}"
+    return types.SimpleNamespace(
+        id=session_id,
+        url=f'{params["success_url"]}?session_id={session_id}',
+        expires_at=int(time.time()) + 24 * 3600
+    )
+
+
+# PAYMENTS_BACKEND=fake swaps Stripe out for local runs and tests.
+PAYMENTS_BACKENDS = {
+    "stripe": stripe_create_session,
+    "fake": fake_create_session,
+}
+create_stripe_session = PAYMENTS_BACKENDS.get(os.getenv("PAYMENTS_BACKEND", "stripe"), stripe_create_session)
+
+
+# Demo price in pence; a stored session is only reused while its amount still matches.
+CHECKOUT_UNIT_AMOUNT = 100
+CHECKOUT_CURRENCY = "gbp"
+# Don't hand out a session that will expire before the user can finish paying.
+CHECKOUT_REUSE_MARGIN = datetime.timedelta(minutes=int(os.getenv("CHECKOUT_REUSE_MARGIN_MINUTES", "10")))
+
+
 @app.post("/api/payments/create-checkout-session")
 @require_auth
+@bulkhead("payments")
 def create_checkout_session(user_id):
     data =request.get_json() or {}
     booking_id = data.get("booking_id")
@@ -890,10 +2462,13 @@ def create_checkout_session(user_id):
     
     
     cur.execute("""
-                SELECT id, service, payment_status
-                FROM bookings
-                WHERE id = %s AND user_id = %s;
-                """, (booking_id, user_id))
+                SELECT b.id, b.service, b.payment_status,
+                       cs.session_id, cs.url, cs.amount, cs.currency,
+                       cs.expires_at > NOW() + %s AS session_reusable
+                FROM bookings b
+                LEFT JOIN checkout_sessions cs ON cs.booking_id = b.id
+                WHERE b.id = %s AND b.user_id = %s;
+                """, (CHECKOUT_REUSE_MARGIN, booking_id, user_id))
     
     booking = cur.fetchone()
     connection.close()
@@ -905,27 +2480,68 @@ def create_checkout_session(user_id):
     if booking["payment_status"] == "paid":
         return jsonify({"error":"Booking already paid"}), 400
     
+    # Double-clicks and reloads get the still-open session back without a Stripe round trip.
+    if (booking["session_reusable"]
+            and booking["amount"] == CHECKOUT_UNIT_AMOUNT
+            and booking["currency"] == CHECKOUT_CURRENCY):
+        return jsonify({
+            "checkout_url" : booking["url"]
+        }), 200
     
     frontend_base = os.getenv("FRONTEND_BASE_URL")
     
-    session = stripe.checkout.Session.create(
-        mode="payment",
-        payment_method_types=["card"],
-        line_items = [{
-            "price_data" : {
-                "currency": "gbp",
-                "product_data":{"name" : booking["service"]},
-                "unit_amount":100
-            },
-            "quantity": 1
-        }],
-        
-        success_url= f"{frontend_base}/payment-success",
-        cancel_url = f"{frontend_base}/payment-cancel",
-        metadata={
-            "booking_id": str(booking["id"])
-        }
-    )
+    try:
+        session = stripe_upstream.call(
+            create_stripe_session,
+            # Same key across our retries and across simultaneous clicks that both missed the
+            # stored session, so Stripe hands back one session instead of creating several.
+            idempotency_key=f"checkout-{booking['id']}-{CHECKOUT_UNIT_AMOUNT}-{booking['session_id'] or 'first'}",
+            mode="payment",
+            payment_method_types=["card"],
+            line_items = [{
+                "price_data" : {
+                    "currency": CHECKOUT_CURRENCY,
+                    "product_data":{"name" : booking["service"]},
+                    "unit_amount": CHECKOUT_UNIT_AMOUNT
+                },
+                "quantity": 1
+            }],
+        
+            success_url= f"{frontend_base}/payment-success",
+            cancel_url = f"{frontend_base}/payment-cancel",
+            metadata={
+                "booking_id": str(booking["id"])
+            }
+        )
+    except UpstreamUnavailable as e:
+        print("Checkout upstream error:", e)
+        response = jsonify({"error": "Online payment is temporarily unavailable. Please try again shortly or pay in person."})
+        response.headers["Retry-After"] = str(max(stripe_upstream.breaker.retry_after(), 5))
+        return response, 503
+    except stripe.StripeError as e:
+        # Stripe rejected this request; trying again won't change the answer.
+        print("Checkout error:", e)
+        return jsonify({"error": "Unable to start online payment. Please pay in person."}), 502
+    
+    try:
+        connection = get_db()
+        cur = connection.cursor()
+        cur.execute("""
+                    INSERT INTO checkout_sessions (booking_id, session_id, url, amount, currency, expires_at)
+                    VALUES (%s, %s, %s, %s, %s, to_timestamp(%s))
+                    ON CONFLICT (booking_id) DO UPDATE
+                    SET session_id = EXCLUDED.session_id,
+                        url = EXCLUDED.url,
+                        amount = EXCLUDED.amount,
+                        currency = EXCLUDED.currency,
+                        expires_at = EXCLUDED.expires_at,
+                        created_at = NOW();
+                    """, (booking["id"], session.id, session.url, CHECKOUT_UNIT_AMOUNT, CHECKOUT_CURRENCY, session.expires_at))
+        connection.commit()
+        connection.close()
+    except Exception as e:
+        # The session is still usable; we just won't be able to reuse it next time.
+        print("Checkout session save error:", e)
     
     return jsonify({
         "checkout_url" : session.url
@@ -933,37 +2549,70 @@ def create_checkout_session(user_id):
     
     
     
+# Applies ledgered Stripe events in the background; WEBHOOK_WORKER_ENABLED=0 when running webhook_worker.py separately.
+webhook_worker = WebhookWorker()
+WEBHOOK_WORKER_ENABLED = os.getenv("WEBHOOK_WORKER_ENABLED", "1") == "1"
+
+
 @app.post("/api/payments/webhook")
 def stripe_Webhook():
-    payload = request.data
+    payload = request.get_data(as_text=True)
     sig_header = request.headers.get("Stripe-Signature")
     
     try:
-        event = stripe.Webhook.construct_event(
+        stripe.Webhook.construct_event(
             payload, sig_header, os.getenv("STRIPE_WEBHOOK_SECRET")
         )
     except Exception as e:
         print("Webhook error:", e)
         return "", 400
     
-    if event["type"] == "checkout.session.completed":
-        session = event["data"]["object"]
-        booking_id = session["metadata"].get("booking_id")
-        
-        
-        if booking_id:
-            connection = get_db()
-            cur = connection.cursor()
-            cur.execute("""
-                        UPDATE bookings
-                        SET payment_status = 'paid',
-                            payment_method = COALESCE(payment_method, 'online')
-                        WHERE id = %s;
-                        """, (booking_id,))
-            connection.commit()
-            connection.close()
+    # Record and acknowledge; the worker does the booking updates, so Stripe never waits on them.
+    # The ledger keeps the body exactly as Stripe signed it.
+    try:
+        is_new = ingest_event(payload)
+    except Exception as e:
+        print("Webhook ledger error:", e)
+        # Non-2xx makes Stripe retry later, which is what we want if we couldn't store it.
+        return "", 500
+    
+    if is_new and WEBHOOK_WORKER_ENABLED:
+        webhook_worker.ensure_started()
+        webhook_worker.wake()
             
     return "", 200
 
+
+@app.get("/api/admin/stripe-events/stats")
+@require_admin
+def admin_stripe_event_stats():
+    try:
+        stats = webhook_worker.stats()
+    except Exception:
+        return jsonify({"error": "Failed to load webhook stats"}), 500
+    return jsonify({"webhooks": stats}), 200
+
+
+@app.post("/api/admin/stripe-events/replay")
+@require_admin
+def admin_replay_stripe_events():
+    data = request.get_json() or {}
+    event_ids = data.get("event_ids")
+    since = data.get("since")
+    
+    if not event_ids and not since:
+        return jsonify({"error": "Provide event_ids or since"}), 400
+    
+    try:
+        replayed = replay_events(event_ids, since)
+    except Exception:
+        return jsonify({"error": "Failed to replay events"}), 500
+    
+    if WEBHOOK_WORKER_ENABLED:
+        webhook_worker.ensure_started()
+        webhook_worker.wake()
+    return jsonify({"replayed": replayed}), 200
+
+
 if __name__ == "__main__":
     app.run(debug=True)
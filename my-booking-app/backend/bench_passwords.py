@@ -0,0 +1,60 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from passwords import PasswordHasher, HashingBusy
+
+
+# Login throughput benchmark: how many password checks per second the hashing
+# pool sustains at a given bcrypt cost, and what that works out to per core.
+#
+#   python bench_passwords.py --rounds 12 --workers 4 --logins 200
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bcrypt login throughput")
+    parser.add_argument("--rounds", type=int, default=int(os.getenv("BCRYPT_ROUNDS", "12")))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=0,
+                        help="simultaneous callers (default: 2x workers)")
+    args = parser.parse_args()
+
+    concurrency = args.concurrency or args.workers * 2
+    hasher = PasswordHasher(workers=args.workers, max_pending=concurrency, rounds=args.rounds, timeout=120)
+
+    stored_hash = hasher.hash_password("correct horse battery staple")
+    # Warm the pool so process start-up isn't counted.
+    with ThreadPoolExecutor(max_workers=args.workers) as warm:
+        list(warm.map(lambda _: hasher.check_password("correct horse battery staple", stored_hash), range(args.workers)))
+
+    rejected = 0
+
+    def login(_):
+        nonlocal rejected
+        try:
+            return hasher.check_password("correct horse battery staple", stored_hash)
+        except HashingBusy:
+            rejected += 1
+            return False
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as callers:
+        results = list(callers.map(login, range(args.logins)))
+    elapsed = time.perf_counter() - started
+
+    ok = sum(1 for r in results if r)
+    per_second = ok / elapsed if elapsed else 0.0
+    print(f"bcrypt rounds:      {args.rounds}")
+    print(f"hashing workers:    {args.workers}")
+    print(f"concurrent callers: {concurrency}")
+    print(f"logins checked:     {ok} ({rejected} rejected as busy)")
+    print(f"elapsed:            {elapsed:.2f}s")
+    print(f"logins/sec:         {per_second:.1f}")
+    print(f"logins/sec/core:    {per_second / args.workers:.1f}")
+    print(f"mean check time:    {hasher.stats()['seconds_total'] / max(1, hasher.stats()['checks']):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
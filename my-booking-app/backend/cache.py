@@ -0,0 +1,163 @@
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+
+import psycopg2
+import psycopg2.extensions
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    # Small thread-safe LRU with a per-entry TTL. Values are stored as-is, so
+    # callers should cache raw data and derive anything time-sensitive on read.
+    #
+    # Fills that race an invalidation: take fill_token() before reading the
+    # source and pass it to set(). If the key was deleted (or the cache cleared)
+    # after the token was taken, the value may predate that write and is dropped.
+
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        # key -> generation of its last delete; bounded, and anything older than
+        # _stale_before is treated as invalidated after the token.
+        self._deleted_at = OrderedDict()
+        self._stale_before = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "stale_fills": 0}
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[0] <= now:
+                if entry is not _MISSING:
+                    del self._data[key]
+                self._stats["misses"] += 1
+                return default
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def fill_token(self):
+        with self._lock:
+            return self._generation
+
+    def set(self, key, value, token=None):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if token is not None and (token < self._stale_before or self._deleted_at.get(key, -1) >= token):
+                self._stats["stale_fills"] += 1
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def delete(self, key):
+        with self._lock:
+            if self._data.pop(key, _MISSING) is not _MISSING:
+                self._stats["invalidations"] += 1
+            self._deleted_at[key] = self._generation
+            self._deleted_at.move_to_end(key)
+            self._generation += 1
+            while len(self._deleted_at) > max(self.maxsize, 1):
+                _, generation = self._deleted_at.popitem(last=False)
+                self._stale_before = max(self._stale_before, generation + 1)
+
+    def clear(self):
+        with self._lock:
+            self._stats["invalidations"] += len(self._data)
+            self._data.clear()
+            self._deleted_at.clear()
+            self._generation += 1
+            self._stale_before = self._generation
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._data)
+        stats["max_size"] = self.maxsize
+        stats["ttl_seconds"] = self.ttl
+        return stats
+
+
+class NotifyListener:
+    # One background thread per worker process that LISTENs on Postgres
+    # channels and hands each payload to that channel's handler. Anything
+    # cached before LISTEN was (re)established may have missed a write, so
+    # every reset callback fires once the listener is connected.
+
+    def __init__(self, dsn, poll_seconds=5.0):
+        self.dsn = dsn
+        self.poll_seconds = poll_seconds
+        self.connected = False
+        self._handlers = {}
+        self._resets = []
+        self._pid = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel, on_notify, on_reset=None):
+        self._handlers[channel] = on_notify
+        if on_reset:
+            self._resets.append(on_reset)
+
+    def ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.connected = False
+            self._thread = threading.Thread(target=self._run, name="pg-listen", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        backoff = 1.0
+        while True:
+            connection = None
+            try:
+                connection = psycopg2.connect(self.dsn)
+                connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                cur = connection.cursor()
+                for channel in self._handlers:
+                    cur.execute(f"LISTEN {channel};")
+                for reset in self._resets:
+                    reset()
+                self.connected = True
+                backoff = 1.0
+
+                while True:
+                    if select.select([connection], [], [], self.poll_seconds) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        note = connection.notifies.pop(0)
+                        handler = self._handlers.get(note.channel)
+                        if handler is None:
+                            continue
+                        try:
+                            handler(note.payload)
+                        except Exception as e:
+                            print("Notify handler error:", e)
+            except Exception as e:
+                print("LISTEN error:", e)
+            finally:
+                self.connected = False
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
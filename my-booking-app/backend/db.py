@@ -1,14 +1,326 @@
 import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import PoolError
 from psycopg2.extras import RealDictCursor
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Pool sizing is per process (each gunicorn worker gets its own pool).
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# How long a request waits for a free connection before giving up.
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+# Idle connections older than this get a SELECT 1 before being handed out.
+DB_POOL_HEALTHCHECK_SECONDS = float(os.getenv("DB_POOL_HEALTHCHECK_SECONDS", "30"))
+
+
+class PoolTimeout(PoolError):
+    pass
+
+
+# Observers get (sql, seconds) for every statement and (seconds,) for every checkout;
+# app.py hangs metrics/profiling off these without db.py knowing about either.
+query_observers = []
+acquire_observers = []
+
+
+def _notify(observers, *args):
+    for fn in observers:
+        try:
+            fn(*args)
+        except Exception as e:
+            print("DB observer error:", e)
+
+
+class TimedCursor:
+    # Proxy around a psycopg2 cursor that reports how long each statement took.
+
+    def __init__(self, raw):
+        object.__setattr__(self, "_raw", raw)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __setattr__(self, name, value):
+        # e.g. cur.itersize = ... must land on the real cursor.
+        setattr(self._raw, name, value)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._raw.close()
+        return False
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return self._raw.execute(query, vars)
+        finally:
+            _notify(query_observers, query, time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return self._raw.executemany(query, vars_list)
+        finally:
+            _notify(query_observers, query, time.perf_counter() - started)
+
+
+def _connect():
+    return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+
+
+class PooledConnection:
+    # Thin proxy so existing handlers can keep calling connection.close(),
+    # which now hands the connection back to the pool instead of dropping it.
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._returned = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    @property
+    def raw(self):
+        return self._raw
+
+    def cursor(self, *args, **kwargs):
+        cur = self._raw.cursor(*args, **kwargs)
+        return TimedCursor(cur) if query_observers else cur
+
+    def close(self):
+        if self._returned:
+            return
+        self._returned = True
+        self._pool.putconn(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            try:
+                self._raw.rollback()
+            except Exception:
+                pass
+        self.close()
+        return False
+
+
+class ConnectionPool:
+
+    def __init__(self, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT,
+                 healthcheck_seconds=DB_POOL_HEALTHCHECK_SECONDS, connect=_connect):
+        if maxconn < 1 or minconn < 0 or minconn > maxconn:
+            raise ValueError("Invalid pool size")
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_seconds = healthcheck_seconds
+        self._connect = connect
+
+        self._cond = threading.Condition()
+        self._idle = []  # list of (raw connection, last returned at)
+        self._in_use = 0
+        self._local = threading.local()
+
+        self._stats = {
+            "created": 0,
+            "checkouts": 0,
+            "reused": 0,
+            "discarded": 0,
+            "healthcheck_failures": 0,
+            "timeouts": 0,
+            "waits": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    def getconn(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        started = time.monotonic()
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw, returned_at = self._idle.pop()
+                    self._in_use += 1
+                    break
+
+                if self._in_use < self.maxconn:
+                    raw = None
+                    self._in_use += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout("Timed out waiting for a database connection")
+                waited = True
+                self._cond.wait(remaining)
+
+            if waited:
+                wait = time.monotonic() - started
+                self._stats["waits"] += 1
+                self._stats["wait_seconds_total"] += wait
+                self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], wait)
+
+        # Connecting and health checks happen outside the lock so a slow
+        # handshake doesn't block other threads returning connections.
+        try:
+            if raw is not None and not self._healthy(raw, returned_at):
+                self._close_raw(raw)
+                with self._cond:
+                    self._stats["healthcheck_failures"] += 1
+                    self._stats["discarded"] += 1
+                raw = None
+
+            if raw is None:
+                raw = self._connect()
+                with self._cond:
+                    self._stats["created"] += 1
+            else:
+                with self._cond:
+                    self._stats["reused"] += 1
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._stats["checkouts"] += 1
+        _notify(acquire_observers, time.monotonic() - started)
+
+        conn = PooledConnection(self, raw)
+        self._checked_out().append(conn)
+        return conn
+
+    def putconn(self, conn):
+        raw = conn.raw
+        checked_out = self._checked_out()
+        if conn in checked_out:
+            checked_out.remove(conn)
+
+        keep = not raw.closed
+        if keep:
+            try:
+                # Never hand the next request a half-finished transaction.
+                if raw.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    raw.rollback()
+            except Exception:
+                keep = False
+
+        with self._cond:
+            self._in_use -= 1
+            if keep and len(self._idle) < self.maxconn:
+                self._idle.append((raw, time.monotonic()))
+                raw = None
+            else:
+                self._stats["discarded"] += 1
+            self._cond.notify()
+
+        if raw is not None:
+            self._close_raw(raw)
+
+    def release_thread_connections(self):
+        # Safety net for handlers that return/raise before closing.
+        for conn in list(self._checked_out()):
+            conn.close()
+
+    def closeall(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for raw, _ in idle:
+            self._close_raw(raw)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats["in_use"] = self._in_use
+            stats["idle"] = len(self._idle)
+        stats["min_size"] = self.minconn
+        stats["max_size"] = self.maxconn
+        return stats
+
+    def prefill(self):
+        while True:
+            with self._cond:
+                if len(self._idle) + self._in_use >= self.minconn:
+                    return
+            raw = self._connect()
+            with self._cond:
+                self._stats["created"] += 1
+                self._idle.append((raw, time.monotonic()))
+
+    def _checked_out(self):
+        if not hasattr(self._local, "conns"):
+            self._local.conns = []
+        return self._local.conns
+
+    def _healthy(self, raw, returned_at):
+        if raw.closed:
+            return False
+        if time.monotonic() - returned_at < self.healthcheck_seconds:
+            return True
+        try:
+            with raw.cursor() as cur:
+                cur.execute("SELECT 1;")
+            raw.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _close_raw(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool, _pool_pid
+    # Rebuild after fork so gunicorn workers never share sockets with the master.
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ConnectionPool()
+                _pool_pid = os.getpid()
+                try:
+                    _pool.prefill()
+                except Exception as e:
+                    print("DB pool prefill failed:", e)
+    return _pool
+
+
 def get_db():
-    connection = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
-    return connection
+    return get_pool().getconn()
+
+
+def release_thread_connections():
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.release_thread_connections()
+
 
-    
+def pool_stats():
+    return get_pool().stats()
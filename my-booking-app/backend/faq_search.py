@@ -0,0 +1,130 @@
+import math
+import re
+import sys
+from collections import Counter
+
+
+# Words that carry no meaning for matching a salon FAQ question.
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for",
+    "from", "how", "i", "if", "in", "is", "it", "me", "my", "of", "on", "or",
+    "so", "the", "there", "to", "we", "what", "when", "where", "which", "who",
+    "will", "with", "you", "your", "any", "have", "get", "please",
+}
+
+
+def tokenize(text):
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if len(word) < 2 or word in STOPWORDS:
+            continue
+        # Cheap plural folding so "hours" matches "hour" and "bookings" matches "booking".
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def chunk_faq(text):
+    # faq_data.txt is "Section:" headers followed by "- bullet" lines.
+    # Each bullet becomes a chunk and remembers its section for the prompt.
+    chunks = []
+    section = ""
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+        if line.startswith("-"):
+            body = line.lstrip("-").strip()
+            if body:
+                chunks.append({"section": section, "text": body})
+        elif line.endswith(":"):
+            section = line[:-1].strip()
+        elif chunks and chunks[-1]["section"] == section:
+            # Wrapped continuation of the previous bullet.
+            chunks[-1]["text"] += " " + line
+        else:
+            chunks.append({"section": section, "text": line})
+    return chunks
+
+
+class BM25Index:
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.docs = [Counter(tokenize(f'{c["section"]} {c["text"]}')) for c in chunks]
+        self.lengths = [sum(doc.values()) for doc in self.docs]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+        doc_freq = Counter()
+        for doc in self.docs:
+            doc_freq.update(doc.keys())
+        n = len(self.docs)
+        self.idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in doc_freq.items()
+        }
+
+    @classmethod
+    def from_text(cls, text):
+        return cls(chunk_faq(text))
+
+    def score(self, query_terms, i):
+        doc = self.docs[i]
+        length_norm = 1 - self.b + self.b * (self.lengths[i] / self.avg_length if self.avg_length else 0)
+        total = 0.0
+        for term in query_terms:
+            tf = doc.get(term)
+            if not tf:
+                continue
+            total += self.idf[term] * tf * (self.k1 + 1) / (tf + self.k1 * length_norm)
+        return total
+
+    def search(self, query, k=4):
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.docs:
+            return []
+
+        results = []
+        for i, doc in enumerate(self.docs):
+            s = self.score(terms, i)
+            if s <= 0:
+                continue
+            coverage = sum(1 for t in terms if t in doc) / len(terms)
+            results.append({"chunk": self.chunks[i], "score": s, "coverage": coverage})
+
+        results.sort(key=lambda r: r["score"], reverse=True)
+        return results[:k]
+
+    def confident_match(self, results, min_coverage=1.0, min_margin=1.5):
+        # Only trust a direct answer when the top chunk contains every query
+        # term and clearly beats the runner-up.
+        if not results:
+            return None
+        best = results[0]
+        if best["coverage"] < min_coverage:
+            return None
+        if len(results) > 1 and best["score"] < results[1]["score"] * min_margin:
+            return None
+        return best["chunk"]
+
+
+def format_chunks(results):
+    return "\n".join(
+        f'- [{r["chunk"]["section"]}] {r["chunk"]["text"]}' if r["chunk"]["section"] else f'- {r["chunk"]["text"]}'
+        for r in results
+    )
+
+
+if __name__ == "__main__":
+    # Offline check: python faq_search.py "is there parking?"
+    with open("faq_data.txt", "r", encoding="utf-8") as f:
+        index = BM25Index.from_text(f.read())
+    query = " ".join(sys.argv[1:]) or "opening hours"
+    hits = index.search(query)
+    for hit in hits:
+        print(f'{hit["score"]:.3f} {hit["coverage"]:.2f} {hit["chunk"]["text"]}')
+    direct = index.confident_match(hits)
+    print("direct answer:", direct["text"] if direct else None)
@@ -0,0 +1,33 @@
+import multiprocessing
+import os
+
+
+# Picked up automatically by `gunicorn app:app` run from this directory.
+# app.py sizes its per-process budgets from the same numbers: the slow classes
+# (llm, payments, auth, live) each get a bulkhead of WEB_THREADS / 8, and bcrypt
+# splits the cores across WEB_CONCURRENCY workers. Everything else is bounded by
+# the DB pool (DB_POOL_MAX) alone.
+workers = int(os.getenv("WEB_CONCURRENCY", str(max(2, multiprocessing.cpu_count()))))
+threads = int(os.getenv("WEB_THREADS", "16"))
+worker_class = "gthread"
+
+
+def post_fork(server, worker):
+    # Runs in each worker before the app is imported, so command-line overrides
+    # (-w / --threads) reach the app too, not just the defaults above.
+    os.environ["WEB_CONCURRENCY"] = str(worker.cfg.workers)
+    os.environ["WEB_THREADS"] = str(worker.cfg.threads)
+
+
+def worker_exit(server, worker):
+    # Last flush from the exiting worker, so child_exit retires its final numbers.
+    from metrics import registry
+
+    registry.flush()
+
+
+def child_exit(server, worker):
+    # Runs in the master once the worker is gone: keep its counters, drop its file.
+    from metrics import metrics_dir, retire_process
+
+    retire_process(worker.pid, metrics_dir(server.pid))
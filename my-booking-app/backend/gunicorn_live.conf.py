@@ -0,0 +1,36 @@
+import os
+
+
+# The live availability process: `gunicorn -c gunicorn_live.conf.py app:app`.
+# Same app, but a gevent worker, so each open /api/availability/live stream is a
+# greenlet instead of a request thread and one process holds thousands of them.
+# It LISTENs on the same NOTIFY channel as the web workers, so writes served
+# there reach these streams. Point VITE_LIVE_API_ROOT at it; everything else
+# stays on the gthread workers from gunicorn.conf.py.
+workers = int(os.getenv("LIVE_CONCURRENCY", "1"))
+worker_class = "gevent"
+worker_connections = int(os.getenv("LIVE_WORKER_CONNECTIONS", "5000"))
+
+
+def post_fork(server, worker):
+    # psycopg2 blocks in C, so without a wait callback one slow query would stall
+    # every greenlet in the worker.
+    from psycogreen.gevent import patch_psycopg
+
+    patch_psycopg()
+    os.environ["WEB_WORKER_CLASS"] = "gevent"
+    os.environ["WEB_CONCURRENCY"] = str(worker.cfg.workers)
+
+
+def worker_exit(server, worker):
+    # Last flush from the exiting worker, so child_exit retires its final numbers.
+    from metrics import registry
+
+    registry.flush()
+
+
+def child_exit(server, worker):
+    # Runs in the master once the worker is gone: keep its counters, drop its file.
+    from metrics import metrics_dir, retire_process
+
+    retire_process(worker.pid, metrics_dir(server.pid))
@@ -2,6 +2,7 @@ print("DEBUG: init_db.py loaded")
 
 
 from db import get_db
+from occupancy import rebuild as rebuild_occupancy
 print("DEBUG: imported get_db")
 
 def init_db():
@@ -44,6 +45,189 @@ def init_db():
                     """)
         print("DEBUG: bookings table created")
         
+        # Services catalog (admin-managed); bookings reference services by name.
+        cur.execute("""
+                    CREATE TABLE IF NOT EXISTS services(
+                        id SERIAL PRIMARY KEY,
+                        name TEXT NOT NULL,
+                        price NUMERIC(10, 2) NOT NULL,
+                        duration INTEGER NOT NULL,
+                        category TEXT,
+                        is_active BOOLEAN NOT NULL DEFAULT TRUE
+                    );
+                    """)
+        print("DEBUG: services table created")
+        
+        # Let the database enforce double-booking rules so concurrent requests can't both win.
+        # Existing duplicate rows block an index, so each gets its own savepoint: a failure
+        # skips just that index and lists the duplicates to clean up before the next run.
+        for index_name, columns in (("bookings_service_slot_key", "service, date, time"),
+                                    ("bookings_user_slot_key", "user_id, date, time")):
+            cur.execute("SAVEPOINT slot_key;")
+            try:
+                cur.execute(f"""
+                            CREATE UNIQUE INDEX IF NOT EXISTS {index_name}
+                            ON bookings ({columns});
+                            """)
+                cur.execute("RELEASE SAVEPOINT slot_key;")
+                print(f"DEBUG: {index_name} created")
+            except Exception as e:
+                cur.execute("ROLLBACK TO SAVEPOINT slot_key;")
+                print(f"DEBUG: SKIPPED {index_name}")
+                print(e)
+                cur.execute(f"""
+                            SELECT {columns}, array_agg(id ORDER BY id) AS booking_ids
+                            FROM bookings
+                            GROUP BY {columns}
+                            HAVING COUNT(*) > 1
+                            ORDER BY date, time;
+                            """)
+                for row in cur.fetchall():
+                    slot = ", ".join(f"{key}={value}" for key, value in row.items() if key != "booking_ids")
+                    print(f"DEBUG:   duplicate {slot}: bookings {row['booking_ids']}")
+        
+        # Payment columns the app already reads/writes; no-ops on databases that have them.
+        cur.execute("""
+                    ALTER TABLE bookings
+                        ADD COLUMN IF NOT EXISTS payment_method TEXT DEFAULT 'in_person',
+                        ADD COLUMN IF NOT EXISTS payment_status TEXT DEFAULT 'pending';
+                    """)
+        # Minutes the booking occupies, copied from the service when booked; NULL means one slot.
+        cur.execute("""
+                    ALTER TABLE bookings
+                        ADD COLUMN IF NOT EXISTS duration INTEGER;
+                    """)
+        
+        # Keyset pagination/filters for the admin bookings list.
+        # (service, ...) and (user_id, ...) filters are covered by the slot indexes above;
+        # bookings_user_slot_key (user_id, date, time) also serves /api/my-bookings pages.
+        cur.execute("""
+                    CREATE INDEX IF NOT EXISTS bookings_date_time_id_idx
+                    ON bookings (date, time, id);
+                    """)
+        cur.execute("""
+                    CREATE INDEX IF NOT EXISTS bookings_payment_status_date_idx
+                    ON bookings (payment_status, date, time, id);
+                    """)
+        print("DEBUG: booking list indexes created")
+        
+        cur.execute("""
+                    ALTER TABLE users
+                        ADD COLUMN IF NOT EXISTS is_admin BOOLEAN DEFAULT FALSE;
+                    """)
+        # Per-user change marker for /api/my-bookings ETag/Last-Modified.
+        cur.execute("""
+                    ALTER TABLE users
+                        ADD COLUMN IF NOT EXISTS bookings_version BIGINT NOT NULL DEFAULT 0,
+                        ADD COLUMN IF NOT EXISTS bookings_changed_at TIMESTAMPTZ NOT NULL DEFAULT NOW();
+                    """)
+        # A trigger rather than app code so every write path (webhook, admin delete, batch) bumps it.
+        cur.execute("""
+                    CREATE OR REPLACE FUNCTION touch_user_bookings() RETURNS trigger AS $$
+                    BEGIN
+                        -- The booking's owner after the write; an UPDATE that moves it bumps both users.
+                        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                            UPDATE users
+                            SET bookings_version = bookings_version + 1, bookings_changed_at = clock_timestamp()
+                            WHERE id = NEW.user_id;
+                        END IF;
+                        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                            UPDATE users
+                            SET bookings_version = bookings_version + 1, bookings_changed_at = clock_timestamp()
+                            WHERE id = OLD.user_id;
+                        END IF;
+                        RETURN NULL;
+                    END;
+                    $$ LANGUAGE plpgsql;
+                    """)
+        cur.execute("DROP TRIGGER IF EXISTS bookings_touch_user ON bookings;")
+        cur.execute("""
+                    CREATE TRIGGER bookings_touch_user
+                    AFTER INSERT OR UPDATE OR DELETE ON bookings
+                    FOR EACH ROW EXECUTE PROCEDURE touch_user_bookings();
+                    """)
+        print("DEBUG: user booking change tracking created")
+        
+        # Keyset pagination for the admin users list (newest first).
+        cur.execute("""
+                    CREATE INDEX IF NOT EXISTS users_created_at_id_idx
+                    ON users (created_at DESC, id DESC);
+                    """)
+        # Trigram indexes make ILIKE '%term%' searches on name/email index-backed.
+        # pg_trgm needs extension rights, so a failure here shouldn't undo the tables above.
+        cur.execute("SAVEPOINT trgm;")
+        try:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+            cur.execute("""
+                        CREATE INDEX IF NOT EXISTS users_name_trgm_idx
+                        ON users USING gin (name gin_trgm_ops);
+                        """)
+            cur.execute("""
+                        CREATE INDEX IF NOT EXISTS users_email_trgm_idx
+                        ON users USING gin (email gin_trgm_ops);
+                        """)
+            cur.execute("RELEASE SAVEPOINT trgm;")
+            print("DEBUG: user search indexes created")
+        except Exception as e:
+            cur.execute("ROLLBACK TO SAVEPOINT trgm;")
+            print("DEBUG: SKIPPED USER SEARCH INDEXES")
+            print(e)
+        
+        # Append-only ledger of Stripe webhook events; the event id dedupes Stripe's retries.
+        cur.execute("""
+                    CREATE TABLE IF NOT EXISTS stripe_events(
+                        id TEXT PRIMARY KEY,
+                        type TEXT NOT NULL,
+                        payload JSONB NOT NULL,
+                        received_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                        processed_at TIMESTAMPTZ,
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        last_error TEXT
+                    );
+                    """)
+        # The body exactly as Stripe signed it, for audits and replays; payload is its parsed form.
+        cur.execute("""
+                    ALTER TABLE stripe_events
+                        ADD COLUMN IF NOT EXISTS raw_payload TEXT;
+                    """)
+        cur.execute("""
+                    CREATE INDEX IF NOT EXISTS stripe_events_pending_idx
+                    ON stripe_events (received_at)
+                    WHERE processed_at IS NULL;
+                    """)
+        print("DEBUG: stripe_events table created")
+        
+        # Latest Stripe Checkout session per booking so repeat "pay" clicks can reuse it.
+        cur.execute("""
+                    CREATE TABLE IF NOT EXISTS checkout_sessions(
+                        booking_id INTEGER PRIMARY KEY REFERENCES bookings(id) ON DELETE CASCADE,
+                        session_id TEXT NOT NULL,
+                        url TEXT NOT NULL,
+                        amount INTEGER NOT NULL,
+                        currency TEXT NOT NULL,
+                        expires_at TIMESTAMPTZ NOT NULL,
+                        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                    );
+                    """)
+        print("DEBUG: checkout_sessions table created")
+
+        # One row per (service, date) with a bit per TIME_SLOTS entry; availability reads this instead of bookings.
+        cur.execute("""
+                    CREATE TABLE IF NOT EXISTS slot_occupancy(
+                        service TEXT NOT NULL,
+                        date DATE NOT NULL,
+                        booked_mask INTEGER NOT NULL DEFAULT 0,
+                        PRIMARY KEY (service, date)
+                    );
+                    """)
+        # Nothing ever read the paid bitmap; drop it from databases that still have it.
+        cur.execute("ALTER TABLE slot_occupancy DROP COLUMN IF EXISTS paid_mask;")
+        # Backfill once for databases that already have bookings.
+        cur.execute("SELECT EXISTS (SELECT 1 FROM slot_occupancy) AS filled;")
+        if not cur.fetchone()["filled"]:
+            rebuild_occupancy(cur)
+        print("DEBUG: slot_occupancy table created")
+
         connection.commit()
         print("DEBUG: commit successful")
         
@@ -0,0 +1,128 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+# Admission control. Bulkheads cap how many requests of one slow class (LLM,
+# payments, hashing, live streams) can hold web threads at once, so a spike in
+# one of them can't starve the rest of the app. RateLimiter is a per-client
+# token bucket. Both refuse immediately (or after a short bounded wait)
+# instead of queueing, and report every decision to an optional observer.
+
+
+class LimitExceeded(Exception):
+
+    def __init__(self, name, retry_after, status):
+        super().__init__(f"{name} limit exceeded")
+        self.name = name
+        self.retry_after = retry_after
+        # 503 when the server is out of capacity, 429 when this client is over its rate.
+        self.status = status
+
+
+class Bulkhead:
+
+    def __init__(self, name, max_concurrent, max_wait=0.0, retry_after=1, observer=None):
+        if max_concurrent < 1:
+            raise ValueError(f"{name}: max_concurrent must be at least 1")
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        # observer(kind, name, outcome) is called once per decision, e.g. for metrics.
+        self.observer = observer
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._stats = {"in_flight": 0, "admitted": 0, "rejected": 0}
+
+    def acquire(self):
+        if self.max_wait > 0:
+            acquired = self._slots.acquire(timeout=self.max_wait)
+        else:
+            acquired = self._slots.acquire(blocking=False)
+        with self._lock:
+            if acquired:
+                self._stats["in_flight"] += 1
+                self._stats["admitted"] += 1
+            else:
+                self._stats["rejected"] += 1
+        self._observe("admitted" if acquired else "rejected")
+        if not acquired:
+            raise LimitExceeded(self.name, self.retry_after, 503)
+
+    def release(self):
+        with self._lock:
+            self._stats["in_flight"] -= 1
+        self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["max_concurrent"] = self.max_concurrent
+        stats["max_wait"] = self.max_wait
+        return stats
+
+    def _observe(self, outcome):
+        if self.observer:
+            try:
+                self.observer("bulkhead", self.name, outcome)
+            except Exception as e:
+                print("Limiter observer error:", e)
+
+
+class RateLimiter:
+    # `rate` tokens per second refill each client's bucket up to `burst`.
+    # Buckets live in this process only, so the effective limit scales with the
+    # number of workers; the least recently seen clients are forgotten first.
+    # A rate of 0 disables the limiter.
+
+    def __init__(self, name, rate, burst, max_clients=10000, observer=None):
+        if rate < 0:
+            raise ValueError(f"{name}: rate must be >= 0")
+        if rate and burst < 1:
+            raise ValueError(f"{name}: burst must be at least 1")
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.observer = observer
+        self._buckets = OrderedDict()  # client -> (tokens, updated_at)
+        self._lock = threading.Lock()
+        self._stats = {"allowed": 0, "limited": 0}
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def check(self, client):
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[client] = (tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            self._stats["allowed" if allowed else "limited"] += 1
+
+        if self.observer:
+            try:
+                self.observer("rate_limit", self.name, "admitted" if allowed else "rejected")
+            except Exception as e:
+                print("Limiter observer error:", e)
+        if not allowed:
+            raise LimitExceeded(self.name, max(1, math.ceil((1 - tokens) / self.rate)), 429)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["clients"] = len(self._buckets)
+        stats["rate"] = self.rate
+        stats["burst"] = self.burst
+        stats["enabled"] = self.enabled
+        return stats
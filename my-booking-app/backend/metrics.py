@@ -0,0 +1,256 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+# Minimal Prometheus-style metrics with no extra dependency.
+#
+# Each process keeps its own counters/histograms in memory and periodically
+# writes them to METRICS_DIR/<pid>.json. /metrics merges the files of live
+# processes, so the numbers add up across gunicorn workers. When a worker
+# exits, the master folds its counters and histograms into retired.json and
+# deletes its file (retire_process), so totals survive recycling without the
+# directory growing a file per worker ever started.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+RETIRED_FILE = "retired.json"
+
+
+def metrics_dir(master_pid=None):
+    # Workers share a parent (the gunicorn master), so by default they share a directory.
+    # The master itself passes its own pid.
+    return os.getenv("METRICS_DIR") or os.path.join(tempfile.gettempdir(),
+                                                    f"booking-metrics-{master_pid or os.getppid()}")
+
+
+METRICS_DIR = metrics_dir()
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+
+class Registry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._types = {}
+        self._buckets = {}
+        self._counters = {}    # (name, labels) -> value
+        self._gauges = {}      # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+        self._gauge_callbacks = []
+        self._flusher = None
+        self._flusher_pid = None
+
+    def counter(self, name, help_text):
+        self._help[name] = help_text
+        self._types[name] = "counter"
+
+    def gauge(self, name, help_text):
+        self._help[name] = help_text
+        self._types[name] = "gauge"
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self._help[name] = help_text
+        self._types[name] = "histogram"
+        self._buckets[name] = tuple(buckets)
+
+    def inc(self, name, labels=None, value=1):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, labels=None, value=0):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name, value, labels=None):
+        buckets = self._buckets[name]
+        key = (name, _label_key(labels))
+        with self._lock:
+            row = self._histograms.get(key)
+            if row is None:
+                row = self._histograms[key] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def add_gauge_callback(self, fn):
+        # fn() -> iterable of (name, labels, value); sampled at every flush.
+        self._gauge_callbacks.append(fn)
+
+    # ---- multi-process plumbing ----
+
+    def ensure_flusher(self):
+        if self._flusher is not None and self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher_pid == os.getpid():
+                return
+            # A forked worker inherits the parent's numbers; start it from zero.
+            if self._flusher_pid is not None:
+                self._counters.clear()
+                self._gauges.clear()
+                self._histograms.clear()
+            self._flusher_pid = os.getpid()
+            self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(METRICS_FLUSH_SECONDS)
+            try:
+                self.flush()
+            except Exception as e:
+                print("Metrics flush error:", e)
+
+    def flush(self):
+        for fn in self._gauge_callbacks:
+            try:
+                for name, labels, value in fn():
+                    self.set(name, labels, value)
+            except Exception as e:
+                print("Metrics gauge error:", e)
+
+        with self._lock:
+            snapshot = {
+                "counters": [[n, list(l), v] for (n, l), v in self._counters.items()],
+                "gauges": [[n, list(l), v] for (n, l), v in self._gauges.items()],
+                "histograms": [[n, list(l), v] for (n, l), v in self._histograms.items()],
+            }
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        _write_snapshot(os.path.join(METRICS_DIR, f"{os.getpid()}.json"), snapshot)
+
+    def render(self):
+        self.flush()
+        counters, gauges, histograms = {}, {}, {}
+        for filename in os.listdir(METRICS_DIR):
+            if not filename.endswith(".json"):
+                continue
+            pid = filename[:-len(".json")]
+            # A file whose process is gone but was never retired (the master died with
+            # it, or it belongs to another run) is stale: skip it.
+            if filename != RETIRED_FILE and not (pid.isdigit() and _pid_alive(int(pid))):
+                continue
+            snapshot = _read_snapshot(os.path.join(METRICS_DIR, filename))
+            if snapshot is None:
+                continue
+            _add_totals(counters, histograms, snapshot)
+            for name, labels, value in snapshot["gauges"]:
+                key = (name, _label_key(labels))
+                gauges[key] = gauges.get(key, 0) + value
+
+        lines = []
+        for name in sorted(self._types):
+            lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {self._types[name]}")
+            if self._types[name] == "counter":
+                for (n, labels), value in sorted(counters.items()):
+                    if n == name:
+                        lines.append(f"{name}{_fmt_labels(labels)} {_fmt_value(value)}")
+            elif self._types[name] == "gauge":
+                for (n, labels), value in sorted(gauges.items()):
+                    if n == name:
+                        lines.append(f"{name}{_fmt_labels(labels)} {_fmt_value(value)}")
+            else:
+                buckets = self._buckets[name]
+                for (n, labels), row in sorted(histograms.items()):
+                    if n != name:
+                        continue
+                    for bound, count in zip(buckets, row):
+                        lines.append(f"{name}_bucket{_fmt_labels(labels + (('le', _fmt_value(bound)),))} {count}")
+                    lines.append(f"{name}_bucket{_fmt_labels(labels + (('le', '+Inf'),))} {row[-1]}")
+                    lines.append(f"{name}_sum{_fmt_labels(labels)} {_fmt_value(row[-2])}")
+                    lines.append(f"{name}_count{_fmt_labels(labels)} {row[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def retire_process(pid, directory=None):
+    # For the gunicorn master's child_exit hook: folds an exited worker's counters
+    # and histograms into retired.json, so totals never go backwards, then deletes
+    # its file. Gauges are point-in-time and die with the worker.
+    directory = directory or METRICS_DIR
+    path = os.path.join(directory, f"{pid}.json")
+    snapshot = _read_snapshot(path)
+    if snapshot is not None:
+        retired_path = os.path.join(directory, RETIRED_FILE)
+        counters, histograms = {}, {}
+        _add_totals(counters, histograms, _read_snapshot(retired_path) or {"counters": [], "histograms": []})
+        _add_totals(counters, histograms, snapshot)
+        _write_snapshot(retired_path, {
+            "counters": [[n, list(l), v] for (n, l), v in counters.items()],
+            "gauges": [],
+            "histograms": [[n, list(l), v] for (n, l), v in histograms.items()],
+        })
+    for leftover in (path, f"{path}.tmp"):
+        try:
+            os.remove(leftover)
+        except FileNotFoundError:
+            pass
+
+
+def _read_snapshot(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_snapshot(path, snapshot):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp, path)
+
+
+def _add_totals(counters, histograms, snapshot):
+    for name, labels, value in snapshot["counters"]:
+        key = (name, _label_key(labels))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, row in snapshot["histograms"]:
+        key = (name, _label_key(labels))
+        merged = histograms.get(key)
+        histograms[key] = row if merged is None else [a + b for a, b in zip(merged, row)]
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _label_key(labels):
+    if not labels:
+        return ()
+    if isinstance(labels, dict):
+        return tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+    return tuple(tuple(pair) for pair in labels)
+
+
+def _fmt_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), " ")}"'
+        for k, v in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _fmt_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+registry = Registry()
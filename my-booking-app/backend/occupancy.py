@@ -0,0 +1,148 @@
+import argparse
+import zlib
+
+from db import get_db
+from schedule import TIME_SLOTS, booking_interval, grid_mask, index_bookings
+
+
+# slot_occupancy keeps one row per (service, date) with a bit per TIME_SLOTS
+# entry, set for slots any booking overlaps. Every booking write updates it in
+# the same transaction, so availability is a primary-key lookup instead of a
+# scan of bookings.
+
+# Writers NOTIFY this channel inside their transaction so every process listening
+# (web workers' caches and live streams) drops the same key on commit.
+AVAILABILITY_CHANNEL = "availability_changed"
+
+
+def booking_mask(time_string, duration=None):
+    # Off-grid or unparsable times that touch no slot get 0.
+    interval = booking_interval(time_string, duration)
+    return grid_mask(*interval) if interval else 0
+
+
+def slots_from_mask(mask):
+    return frozenset(slot for i, slot in enumerate(TIME_SLOTS) if mask & (1 << i))
+
+
+# Call before commit: pg_notify is transactional, so listeners only hear about writes that actually land.
+def notify_availability_change(cur, service, booking_date):
+    cur.execute("SELECT pg_notify(%s, %s);", (AVAILABILITY_CHANNEL, f"{booking_date.isoformat()}|{service}"))
+
+
+def lock_days(cur, service_days=(), user_days=()):
+    # Transaction-scoped advisory locks serializing writers of the same service-day
+    # or user-day, so check-then-insert and mask recomputes can't interleave.
+    # Taken in key order so two writers can never deadlock on each other.
+    keys = {zlib.crc32(f"service|{service}|{day}".encode("utf-8")) for service, day in service_days}
+    keys |= {zlib.crc32(f"user|{user_id}|{day}".encode("utf-8")) for user_id, day in user_days}
+    if keys:
+        cur.execute("".join("SELECT pg_advisory_xact_lock(%s);" for _ in keys), sorted(keys))
+
+
+def _masks_by_day(items):
+    masks = {}
+    for service, booking_date, time_string, duration in items:
+        key = (service, booking_date)
+        masks[key] = masks.get(key, 0) | booking_mask(time_string, duration)
+    return masks
+
+
+def mark_booked(cur, items):
+    # items: iterable of (service, date, time, duration). Adding a booking can only set bits.
+    masks = _masks_by_day(items)
+    if not masks:
+        return
+    keys = list(masks)
+    cur.execute("""
+                INSERT INTO slot_occupancy (service, date, booked_mask)
+                SELECT * FROM unnest(%s::text[], %s::date[], %s::int[])
+                ON CONFLICT (service, date) DO UPDATE
+                SET booked_mask = slot_occupancy.booked_mask | EXCLUDED.booked_mask;
+                """, ([k[0] for k in keys], [k[1] for k in keys], [masks[k] for k in keys]))
+
+
+def day_mask(rows):
+    # The booked mask for one (service, date) from its bookings, via the interval index.
+    return index_bookings(rows).occupied_mask()
+
+
+def refresh_day(cur, service, booking_date):
+    # Removing a booking can't just clear its bits (another booking may overlap the
+    # same slot), so recompute the day from what's left. Call under lock_days.
+    cur.execute("""
+                SELECT time, duration
+                FROM bookings
+                WHERE service = %s AND date = %s;
+                """, (service, booking_date))
+    cur.execute("""
+                INSERT INTO slot_occupancy (service, date, booked_mask)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (service, date) DO UPDATE
+                SET booked_mask = EXCLUDED.booked_mask;
+                """, (service, booking_date, day_mask(cur.fetchall())))
+
+
+def expected_masks(cur):
+    cur.execute("""
+                SELECT service, date, time, duration
+                FROM bookings
+                ORDER BY service, date;
+                """)
+    days = {}
+    for row in cur.fetchall():
+        days.setdefault((row["service"], row["date"]), []).append(row)
+    return {key: day_mask(rows) for key, rows in days.items()}
+
+
+def find_drift(cur):
+    expected = expected_masks(cur)
+    cur.execute("SELECT service, date, booked_mask FROM slot_occupancy;")
+    actual = {(row["service"], row["date"]): row["booked_mask"] for row in cur.fetchall()}
+
+    drift = []
+    for service, booking_date in sorted(set(expected) | set(actual), key=lambda k: (k[1], k[0])):
+        want = expected.get((service, booking_date), 0)
+        have = actual.get((service, booking_date), 0)
+        if want != have:
+            drift.append({
+                "service": service,
+                "date": booking_date,
+                "expected_booked": want,
+                "actual_booked": have,
+            })
+    return drift
+
+
+def rebuild(cur):
+    # Replace the whole table from bookings; callers commit.
+    cur.execute("LOCK TABLE slot_occupancy IN EXCLUSIVE MODE;")
+    expected = expected_masks(cur)
+    cur.execute("DELETE FROM slot_occupancy;")
+    keys = [key for key, mask in expected.items() if mask]
+    cur.execute("""
+                INSERT INTO slot_occupancy (service, date, booked_mask)
+                SELECT * FROM unnest(%s::text[], %s::date[], %s::int[]);
+                """, ([k[0] for k in keys], [k[1] for k in keys], [expected[k] for k in keys]))
+
+
+if __name__ == "__main__":
+    #   python occupancy.py            report drift between slot_occupancy and bookings
+    #   python occupancy.py --rebuild  recompute slot_occupancy from bookings
+    parser = argparse.ArgumentParser(description="Verify or rebuild the slot occupancy bitmaps")
+    parser.add_argument("--rebuild", action="store_true")
+    args = parser.parse_args()
+
+    connection = get_db()
+    cur = connection.cursor()
+    drift = find_drift(cur)
+    for row in drift:
+        print(f'{row["date"]} {row["service"]}: '
+              f'booked {sorted(slots_from_mask(row["actual_booked"]))} expected {sorted(slots_from_mask(row["expected_booked"]))}')
+    print(f"{len(drift)} (service, date) rows drifted")
+
+    if args.rebuild:
+        rebuild(cur)
+        connection.commit()
+        print("slot_occupancy rebuilt from bookings")
+    connection.close()
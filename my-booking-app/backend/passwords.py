@@ -0,0 +1,126 @@
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+
+# Cost for new hashes. Raising it makes existing users rehash on their next login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Hashing runs in separate processes so it never holds a web worker's GIL.
+# Every gunicorn worker gets its own pool, so split the cores between them
+# (WEB_CONCURRENCY is gunicorn's worker count) instead of giving each all of them.
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY))))
+# Hashes allowed in flight (running + queued) per web worker before we answer 503.
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", str(BCRYPT_WORKERS * 4)))
+BCRYPT_TIMEOUT = float(os.getenv("BCRYPT_TIMEOUT", "10"))
+
+_COST_RE = re.compile(r"^\$2[abxy]?\$(\d{2})\$")
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def _hashpw(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode()
+
+
+def _checkpw(password, stored_hash):
+    return bcrypt.checkpw(password, stored_hash)
+
+
+class PasswordHasher:
+
+    def __init__(self, workers=BCRYPT_WORKERS, max_pending=BCRYPT_MAX_PENDING,
+                 rounds=BCRYPT_ROUNDS, timeout=BCRYPT_TIMEOUT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.timeout = timeout
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._stats = {"hashes": 0, "checks": 0, "rehashes": 0, "rejected": 0, "pool_restarts": 0,
+                       "seconds_total": 0.0}
+
+    def _get_executor(self):
+        # One pool per web worker; spawn (not fork) because the parent is multi-threaded.
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _reset_executor(self, broken):
+        # A child that died (OOM kill, segfault) breaks the whole pool; replace it
+        # once, however many requests noticed, and let the next submit start fresh.
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = None
+            self._stats["pool_restarts"] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, fn, *args):
+        if not self._pending.acquire(blocking=False):
+            self._count("rejected")
+            raise HashingBusy("Too many password operations in progress")
+        started = time.monotonic()
+        try:
+            for attempt in range(2):
+                executor = self._get_executor()
+                try:
+                    future = executor.submit(fn, *args)
+                    return future.result(timeout=self.timeout)
+                except FutureTimeout:
+                    future.cancel()
+                    raise HashingBusy("Password operation timed out")
+                except BrokenProcessPool:
+                    self._reset_executor(executor)
+                    if attempt:
+                        raise HashingBusy("Password workers restarting")
+        finally:
+            with self._lock:
+                self._stats["seconds_total"] += time.monotonic() - started
+            self._pending.release()
+
+    def hash_password(self, password):
+        self._count("hashes")
+        return self._run(_hashpw, password.encode("utf-8"), self.rounds)
+
+    def check_password(self, password, stored_hash):
+        self._count("checks")
+        return self._run(_checkpw, password.encode("utf-8"), stored_hash.encode("utf-8"))
+
+    def needs_rehash(self, stored_hash):
+        match = _COST_RE.match(stored_hash or "")
+        return match is None or int(match.group(1)) != self.rounds
+
+    def record_rehash(self):
+        self._count("rehashes")
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["workers"] = self.workers
+        stats["max_pending"] = self.max_pending
+        stats["rounds"] = self.rounds
+        return stats
+
+
+password_hasher = PasswordHasher()
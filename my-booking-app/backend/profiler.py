@@ -0,0 +1,146 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+
+# Opt-in per-request sampling profiler.
+#
+# One background thread per process wakes every PROFILE_INTERVAL_MS and grabs
+# the current stack of each thread that is serving a profiled request. Only
+# profiled requests pay anything, and the cost is a stack walk per interval.
+# Results are written as collapsed stacks (flamegraph.pl / speedscope) plus a
+# JSON summary with the SQL statements the request ran.
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "500"))
+
+
+class RequestProfile:
+
+    def __init__(self, label):
+        self.id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.stacks = Counter()
+        self.sql = []
+        self.duration = None
+
+    def add_sql(self, sql, seconds):
+        text = sql.decode("utf-8", "replace") if isinstance(sql, bytes) else str(sql)
+        self.sql.append({
+            "sql": " ".join(text.split()),
+            "ms": round(seconds * 1000, 3),
+            "at_ms": round((time.perf_counter() - self.started) * 1000, 3),
+        })
+
+
+class Sampler:
+
+    def __init__(self, interval_ms=PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000.0
+        self._active = {}  # thread id -> RequestProfile
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="request-sampler", daemon=True)
+        self._thread.start()
+
+    def start(self, label):
+        profile = RequestProfile(label)
+        with self._lock:
+            self._ensure_thread()
+            self._active[threading.get_ident()] = profile
+        return profile
+
+    def current(self):
+        return self._active.get(threading.get_ident())
+
+    def stop(self):
+        with self._lock:
+            profile = self._active.pop(threading.get_ident(), None)
+        if profile is not None:
+            profile.duration = time.perf_counter() - profile.started
+        return profile
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                active = dict(self._active)
+            frames = sys._current_frames()
+            for tid, profile in active.items():
+                frame = frames.get(tid)
+                if frame is not None:
+                    profile.stacks[_collapse(frame)] += 1
+
+
+def _collapse(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    names.reverse()
+    return ";".join(names)
+
+
+def save_profile(profile, meta):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime(profile.started_at))
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", profile.label).strip("_")[:60] or "request"
+    base = os.path.join(PROFILE_DIR, f"{stamp}-{slug}-{profile.id}")
+
+    with open(f"{base}.collapsed", "w", encoding="utf-8") as f:
+        for stack, count in profile.stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+    summary = dict(meta)
+    summary.update({
+        "id": profile.id,
+        "label": profile.label,
+        "started_at": profile.started_at,
+        "duration_ms": round((profile.duration or 0) * 1000, 3),
+        "samples": sum(profile.stacks.values()),
+        "interval_ms": PROFILE_INTERVAL_MS,
+        "sql_count": len(profile.sql),
+        "sql_ms": round(sum(q["ms"] for q in profile.sql), 3),
+        "sql": profile.sql,
+    })
+    with open(f"{base}.json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+    _prune()
+    return os.path.basename(base)
+
+
+def list_profiles():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    return sorted((name[:-5] for name in os.listdir(PROFILE_DIR) if name.endswith(".json")), reverse=True)
+
+
+def _prune():
+    names = list_profiles()
+    for name in names[PROFILE_KEEP:]:
+        for ext in (".json", ".collapsed"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, name + ext))
+            except OSError:
+                pass
+
+
+sampler = Sampler()
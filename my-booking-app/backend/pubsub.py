@@ -0,0 +1,182 @@
+import collections
+import os
+import threading
+import time
+
+
+# Fan-out of state changes to long-lived subscribers (SSE streams).
+#
+# Writers only mark a key dirty. One dispatcher thread per process coalesces
+# bursts, recomputes each dirty key once (however many clients watch it),
+# diffs it against what was last published and appends the changed entries to
+# every subscriber's queue. A subscriber is a deque plus a Condition, so the
+# hub itself never needs a thread per client.
+
+
+class Subscription:
+
+    def __init__(self, keys, max_pending):
+        self.keys = tuple(keys)
+        self._events = collections.deque()
+        self._cond = threading.Condition()
+        self._max_pending = max_pending
+        self._lagged = False
+
+    def push(self, event):
+        with self._cond:
+            if len(self._events) >= self._max_pending:
+                # Reader can't keep up: drop the backlog and have it resync from full state.
+                self._events.clear()
+                self._lagged = True
+            else:
+                self._events.append(event)
+            self._cond.notify()
+
+    def wait(self, timeout):
+        # -> (events, lagged); both empty/False when the timeout passes quietly.
+        with self._cond:
+            if not self._events and not self._lagged:
+                self._cond.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            lagged, self._lagged = self._lagged, False
+        return events, lagged
+
+
+class FanoutHub:
+
+    def __init__(self, snapshot, max_subscribers=1000, max_pending=100, coalesce_seconds=0.05):
+        # snapshot(key) -> dict of the key's full current state.
+        self._snapshot = snapshot
+        self.max_subscribers = max_subscribers
+        self.max_pending = max_pending
+        self.coalesce_seconds = coalesce_seconds
+        self._lock = threading.Lock()
+        self._subs = {}    # key -> set of Subscription
+        self._state = {}   # key -> last state published to its subscribers
+        self._dirty = set()
+        self._count = 0
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._stats = {"published": 0, "recomputes": 0, "rejected": 0, "errors": 0}
+
+    def ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            # A forked worker inherits no live connections, so start from nothing.
+            if self._pid is not None:
+                self._subs.clear()
+                self._state.clear()
+                self._dirty.clear()
+                self._count = 0
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="fanout-hub", daemon=True)
+            self._thread.start()
+
+    def subscribe(self, keys):
+        # Returns (subscription, {key: state}) or (None, None) when the process is at capacity.
+        self.ensure_started()
+        subscription = Subscription(keys, self.max_pending)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                self._stats["rejected"] += 1
+                return None, None
+            self._count += 1
+            for key in subscription.keys:
+                self._subs.setdefault(key, set()).add(subscription)
+            # Registered and read under one lock, so every later change reaches this
+            # subscriber as a delta against exactly the state it was handed.
+            states = {key: self._state.get(key) for key in subscription.keys}
+        try:
+            for key, state in states.items():
+                if state is None:
+                    states[key] = self._baseline(key)
+        except Exception:
+            self.unsubscribe(subscription)
+            raise
+        return subscription, states
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._count -= 1
+            for key in subscription.keys:
+                subs = self._subs.get(key)
+                if subs is None:
+                    continue
+                subs.discard(subscription)
+                if not subs:
+                    del self._subs[key]
+                    self._state.pop(key, None)
+
+    def current(self, key):
+        with self._lock:
+            state = self._state.get(key)
+        return state if state is not None else self._baseline(key)
+
+    def mark_dirty(self, key):
+        # Cheap and non-blocking: safe to call from the LISTEN thread.
+        with self._lock:
+            if key not in self._subs:
+                return
+            self._dirty.add(key)
+        self._wake.set()
+
+    def mark_all_dirty(self):
+        with self._lock:
+            self._dirty.update(self._subs)
+        self._wake.set()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["subscribers"] = self._count
+            stats["keys"] = len(self._subs)
+        return stats
+
+    def _baseline(self, key):
+        state = self._snapshot(key)
+        with self._lock:
+            if key in self._subs:
+                state = self._state.setdefault(key, state)
+        return state
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            # A short pause lets a burst (e.g. a batch booking) collapse into one recompute per key.
+            time.sleep(self.coalesce_seconds)
+            self._wake.clear()
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+            for key in dirty:
+                try:
+                    self._publish(key, self._snapshot(key))
+                except Exception as e:
+                    print("Fan-out recompute error:", e)
+                    with self._lock:
+                        self._stats["errors"] += 1
+
+    def _publish(self, key, new):
+        with self._lock:
+            self._stats["recomputes"] += 1
+            subs = self._subs.get(key)
+            if not subs:
+                return
+            old = self._state.get(key)
+            self._state[key] = new
+            subs = list(subs)
+        if old is None:
+            event = ("snapshot", key, new)
+        else:
+            changed = {k: v for k, v in new.items() if old.get(k) != v}
+            if not changed:
+                return
+            event = ("delta", key, changed)
+        for subscription in subs:
+            subscription.push(event)
+        with self._lock:
+            self._stats["published"] += len(subs)
@@ -0,0 +1,200 @@
+import bisect
+import datetime
+
+
+# Scheduling engine: a booking is a [start, end) interval in minutes after
+# midnight, sized by its service's duration. Conflict checks run against an
+# IntervalIndex per resource-day (a service's day, or a user's day). Bookings
+# start on the hourly TIME_SLOTS grid; since every interval then contains the
+# start of each slot it touches, two bookings that share a grid slot always
+# overlap, and the per-slot bitmaps answer exactly what the intervals would.
+
+# Static schedule for availability endpoints (UI-driven booking only).
+TIME_SLOTS = [
+    "09:00",
+    "10:00",
+    "11:00",
+    "12:00",
+    "13:00",
+    "14:00",
+    "15:00",
+    "16:00",
+    "17:00"
+]
+
+SLOT_MINUTES = 60
+# Bookings made before durations were tracked (or for services not in the catalog).
+DEFAULT_DURATION = SLOT_MINUTES
+
+
+def parse_minutes(time_string):
+    # "HH:MM" -> minutes after midnight, or None if it isn't a time of day.
+    try:
+        hours, minutes = str(time_string).split(":")
+        hours, minutes = int(hours), int(minutes)
+    except ValueError:
+        return None
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None
+    return hours * 60 + minutes
+
+
+def format_minutes(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+SLOT_STARTS = [parse_minutes(slot) for slot in TIME_SLOTS]
+DAY_START = SLOT_STARTS[0]
+# The salon closes when the last slot ends; nothing may run past it.
+DAY_END = SLOT_STARTS[-1] + SLOT_MINUTES
+
+# date.weekday() values the salon is closed on (Sunday).
+CLOSED_WEEKDAYS = frozenset({6})
+WEEKDAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+def is_slot_start(minutes):
+    return minutes in SLOT_STARTS
+
+
+def is_open(day):
+    return day.weekday() not in CLOSED_WEEKDAYS
+
+
+def booking_interval(time_string, duration=None):
+    start = parse_minutes(time_string)
+    if start is None:
+        return None
+    return start, start + (duration or DEFAULT_DURATION)
+
+
+def grid_mask(start, end):
+    # Bit i is set when TIME_SLOTS[i] overlaps [start, end).
+    mask = 0
+    for i, slot_start in enumerate(SLOT_STARTS):
+        if slot_start < end and start < slot_start + SLOT_MINUTES:
+            mask |= 1 << i
+    return mask
+
+
+class IntervalIndex:
+    # Intervals sorted by start, plus a running max of their ends. Because the
+    # running max never decreases, "does anything overlap [start, end)?" is one
+    # bisect and one lookup. Overlapping entries (legacy data) are fine.
+
+    def __init__(self, intervals=()):
+        # intervals: iterable of (start, end, payload)
+        items = sorted(intervals, key=lambda item: (item[0], item[1]))
+        self._starts = [item[0] for item in items]
+        self._ends = [item[1] for item in items]
+        self._payloads = [item[2] for item in items]
+        self._max_end = []
+        running = None
+        for end in self._ends:
+            running = end if running is None else max(running, end)
+            self._max_end.append(running)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def add(self, start, end, payload=None):
+        i = bisect.bisect_right(self._starts, start)
+        self._starts.insert(i, start)
+        self._ends.insert(i, end)
+        self._payloads.insert(i, payload)
+        running = self._max_end[i - 1] if i else None
+        self._max_end[i:] = []
+        for end_at in self._ends[i:]:
+            running = end_at if running is None else max(running, end_at)
+            self._max_end.append(running)
+
+    def overlaps(self, start, end):
+        i = bisect.bisect_left(self._starts, end)
+        return i > 0 and self._max_end[i - 1] > start
+
+    def free_gaps(self, day_start=DAY_START, day_end=DAY_END, min_length=1):
+        # Free [start, end) stretches between day_start and day_end, in order.
+        gaps = []
+        cursor = day_start
+        for start, end in zip(self._starts, self._ends):
+            if start >= day_end:
+                break
+            if start - cursor >= min_length:
+                gaps.append((cursor, start))
+            cursor = max(cursor, end)
+        if day_end - cursor >= min_length:
+            gaps.append((cursor, day_end))
+        return gaps
+
+    def occupied_mask(self):
+        # The grid slots that any interval touches.
+        mask = 0
+        for start, end in zip(self._starts, self._ends):
+            mask |= grid_mask(start, end)
+        return mask
+
+
+def index_bookings(rows):
+    # rows: dicts with time/duration (e.g. straight from the bookings table).
+    intervals = []
+    for row in rows:
+        interval = booking_interval(row["time"], row.get("duration"))
+        if interval is not None:
+            intervals.append((interval[0], interval[1], row))
+    return IntervalIndex(intervals)
+
+
+def mask_index(mask):
+    # The grid slots set in an occupancy bitmap, as an index of whole-slot intervals.
+    return IntervalIndex((start, start + SLOT_MINUTES, None)
+                         for i, start in enumerate(SLOT_STARTS) if mask & (1 << i))
+
+
+def starts_in_gaps(gaps, duration):
+    # Grid start times where a booking of this length fits inside one free gap.
+    starts = []
+    for gap_start, gap_end in gaps:
+        i = bisect.bisect_left(SLOT_STARTS, gap_start)
+        while i < len(SLOT_STARTS) and SLOT_STARTS[i] + duration <= gap_end:
+            starts.append(SLOT_STARTS[i])
+            i += 1
+    return starts
+
+
+def free_starts(index, duration, after=DAY_START, before=DAY_END):
+    # Every grid start on one resource-day where `duration` minutes are free and
+    # the booking stays inside opening hours and the [after, before) window.
+    gaps = index.free_gaps(max(after, DAY_START), min(before, DAY_END), min_length=duration)
+    return starts_in_gaps(gaps, duration)
+
+
+def earliest_free(indexes, durations, start_date, end_date, now, count,
+                  after=DAY_START, before=DAY_END, weekdays=None):
+    # Sweeps days, then grid start times, then services in order, so results come
+    # out soonest first and the sweep stops as soon as it has `count` of them.
+    # Each open day's candidates come from its free gaps, not a probe per slot.
+    # indexes: {(service, date): IntervalIndex}; durations: {service: minutes}.
+    found = []
+    empty = IntervalIndex()
+    day = start_date
+    while day <= end_date and len(found) < count:
+        if is_open(day) and (weekdays is None or day.weekday() in weekdays):
+            fits = {service: set(free_starts(indexes.get((service, day), empty), duration, after, before))
+                    for service, duration in durations.items()}
+            for start in SLOT_STARTS:
+                # Past-slot rule: today's slots that have already started are gone.
+                if day == now.date() and datetime.datetime.combine(day, datetime.time(start // 60, start % 60)) <= now:
+                    continue
+                for service, duration in durations.items():
+                    if start not in fits[service]:
+                        continue
+                    found.append({
+                        "service": service,
+                        "date": day.isoformat(),
+                        "time": format_minutes(start),
+                        "ends_at": format_minutes(start + duration),
+                    })
+                    if len(found) >= count:
+                        return found
+        day += datetime.timedelta(days=1)
+    return found
@@ -0,0 +1,64 @@
+import csv
+import datetime
+import io
+import json
+
+import pytest
+
+
+BOOKING_DATE = datetime.date(2030, 1, 8)
+
+
+@pytest.fixture
+def admin_headers():
+    from app import create_token
+
+    return {"Authorization": f"Bearer {create_token(1, is_admin=True)}"}
+
+
+def add_booking(cur, name, email, service, time_string, notes=None):
+    cur.execute("""
+                INSERT INTO users (name, email, password_hash)
+                VALUES (%s, %s, 'x')
+                RETURNING id;
+                """, (name, email))
+    user_id = cur.fetchone()["id"]
+    cur.execute("""
+                INSERT INTO bookings (user_id, service, date, time, duration, notes)
+                VALUES (%s, %s, %s, %s, 60, %s)
+                RETURNING id;
+                """, (user_id, service, BOOKING_DATE, time_string, notes))
+    booking_id = cur.fetchone()["id"]
+    cur.connection.commit()
+    return booking_id
+
+
+def test_export_takes_the_list_filters(client, db_cursor, admin_headers):
+    add_booking(db_cursor, "Ana", "ana@gmail.com", "Silk Press", "09:00")
+    wanted = add_booking(db_cursor, "Bea", "bea@gmail.com", "Braids", "10:00")
+
+    listed = client.get("/api/admin/bookings?service=Braids", headers=admin_headers)
+    exported = client.get("/api/admin/bookings/export?format=ndjson&service=Braids", headers=admin_headers)
+
+    assert [row["id"] for row in listed.get_json()["bookings"]] == [wanted]
+    assert [json.loads(line)["id"] for line in exported.get_data(as_text=True).splitlines()] == [wanted]
+
+
+def test_export_rejects_bad_filters(client, db_cursor, admin_headers):
+    response = client.get("/api/admin/bookings/export?user_id=abc", headers=admin_headers)
+
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Invalid user_id"
+
+
+def test_csv_export_neutralizes_formulas(client, db_cursor, admin_headers):
+    add_booking(db_cursor, "=HYPERLINK(\"http://x\")", "eve@gmail.com", "Silk Press", "09:00",
+                notes="+1 call first")
+    add_booking(db_cursor, "Dee", "dee@gmail.com", "Silk Press", "10:00", notes="-@ both")
+
+    response = client.get("/api/admin/bookings/export", headers=admin_headers)
+
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [row["user_name"] for row in rows] == ["'=HYPERLINK(\"http://x\")", "Dee"]
+    assert [row["notes"] for row in rows] == ["'+1 call first", "'-@ both"]
+    assert rows[0]["date"] == BOOKING_DATE.isoformat()
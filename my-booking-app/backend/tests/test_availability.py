@@ -0,0 +1,59 @@
+import datetime
+
+import pytest
+
+
+SERVICE = "Silk Press"
+BOOKING_DATE = datetime.date(2030, 1, 8)
+
+
+@pytest.fixture
+def catalog(db_cursor):
+    from app import bump_services_version
+
+    db_cursor.execute("TRUNCATE services RESTART IDENTITY;")
+    db_cursor.execute("""
+                      INSERT INTO services (name, price, duration, category)
+                      VALUES (%s, 85, 90, 'Hair');
+                      """, (SERVICE,))
+    db_cursor.connection.commit()
+    # The catalog snapshot only rebuilds when told the services changed.
+    bump_services_version()
+    return {SERVICE: 90}
+
+
+def auth_header(cur):
+    from app import create_token
+
+    cur.execute("""
+                INSERT INTO users (name, email, password_hash)
+                VALUES ('Client', 'client@gmail.com', 'x')
+                RETURNING id;
+                """)
+    user_id = cur.fetchone()["id"]
+    cur.connection.commit()
+    return {"Authorization": f"Bearer {create_token(user_id)}"}
+
+
+def test_next_available_rejects_unknown_services(client, catalog):
+    response = client.get(f"/api/availability/next?services={SERVICE},Nope&from={BOOKING_DATE}")
+
+    assert response.status_code == 400
+    assert "Nope" in response.get_json()["error"]
+
+
+def test_next_available_uses_catalog_duration(client, catalog):
+    response = client.get(f"/api/availability/next?service={SERVICE}&from={BOOKING_DATE}&count=1")
+
+    assert response.status_code == 200
+    assert response.get_json()["slots"] == [
+        {"service": SERVICE, "date": BOOKING_DATE.isoformat(), "time": "09:00", "ends_at": "10:30"},
+    ]
+
+
+def test_booking_rejects_unknown_service(client, db_cursor, catalog):
+    response = client.post("/api/book", headers=auth_header(db_cursor),
+                           json={"service": "Nope", "date": BOOKING_DATE.isoformat(), "time": "10:00"})
+
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Unknown service: Nope"
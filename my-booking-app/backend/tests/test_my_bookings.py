@@ -0,0 +1,81 @@
+import datetime
+
+
+BOOKING_DATE = datetime.date(2030, 1, 8)
+
+
+def add_user(cur, email):
+    cur.execute("""
+                INSERT INTO users (name, email, password_hash)
+                VALUES ('Client', %s, 'x')
+                RETURNING id;
+                """, (email,))
+    user_id = cur.fetchone()["id"]
+    cur.connection.commit()
+    return user_id
+
+
+def add_booking(cur, user_id, time_string="10:00"):
+    cur.execute("""
+                INSERT INTO bookings (user_id, service, date, time, duration)
+                VALUES (%s, 'Silk Press', %s, %s, 60)
+                RETURNING id;
+                """, (user_id, BOOKING_DATE, time_string))
+    booking_id = cur.fetchone()["id"]
+    cur.connection.commit()
+    return booking_id
+
+
+def bookings_version(cur, user_id):
+    cur.execute("SELECT bookings_version FROM users WHERE id = %s;", (user_id,))
+    version = cur.fetchone()["bookings_version"]
+    cur.connection.commit()
+    return version
+
+
+def auth(user_id, etag=None):
+    from app import create_token
+
+    headers = {"Authorization": f"Bearer {create_token(user_id)}"}
+    if etag:
+        headers["If-None-Match"] = etag
+    return headers
+
+
+def test_update_bumps_validator(client, db_cursor):
+    user_id = add_user(db_cursor, "client@gmail.com")
+    booking_id = add_booking(db_cursor, user_id)
+
+    first = client.get("/api/my-bookings", headers=auth(user_id))
+    etag = first.headers["ETag"]
+    assert first.status_code == 200
+    assert client.get("/api/my-bookings", headers=auth(user_id, etag)).status_code == 304
+
+    version = bookings_version(db_cursor, user_id)
+    db_cursor.execute("UPDATE bookings SET notes = 'Bring photos' WHERE id = %s;", (booking_id,))
+    db_cursor.connection.commit()
+    assert bookings_version(db_cursor, user_id) > version
+
+    after = client.get("/api/my-bookings", headers=auth(user_id, etag))
+    assert after.status_code == 200
+    assert after.headers["ETag"] != etag
+    assert after.get_json()["bookings"][0]["notes"] == "Bring photos"
+
+
+def test_insert_delete_and_reassign_bump_owners(client, db_cursor):
+    first = add_user(db_cursor, "first@gmail.com")
+    second = add_user(db_cursor, "second@gmail.com")
+
+    booking_id = add_booking(db_cursor, first)
+    assert bookings_version(db_cursor, first) == 1
+
+    before = bookings_version(db_cursor, first), bookings_version(db_cursor, second)
+    db_cursor.execute("UPDATE bookings SET user_id = %s WHERE id = %s;", (second, booking_id))
+    db_cursor.connection.commit()
+    assert bookings_version(db_cursor, first) > before[0]
+    assert bookings_version(db_cursor, second) > before[1]
+
+    before = bookings_version(db_cursor, second)
+    db_cursor.execute("DELETE FROM bookings WHERE id = %s;", (booking_id,))
+    db_cursor.connection.commit()
+    assert bookings_version(db_cursor, second) > before
@@ -0,0 +1,142 @@
+import datetime
+import hashlib
+import hmac
+import json
+import time
+
+from conftest import WEBHOOK_SECRET
+
+
+SERVICE = "Silk Press"
+BOOKING_DATE = datetime.date(2030, 1, 8)
+
+
+def sign_payload(payload, secret=WEBHOOK_SECRET, timestamp=None):
+    # Stripe-Signature header for a locally made event, so the webhook runs end to end without Stripe.
+    timestamp = int(timestamp or time.time())
+    signature = hmac.new(secret.encode("utf-8"), f"{timestamp}.{payload}".encode("utf-8"), hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def fake_event(event_id, booking_id=None, event_type="checkout.session.completed"):
+    metadata = {"booking_id": str(booking_id)} if booking_id is not None else {}
+    return {
+        "id": event_id,
+        "object": "event",
+        "type": event_type,
+        "data": {"object": {"object": "checkout.session", "metadata": metadata}},
+    }
+
+
+def post_event(client, event, secret=WEBHOOK_SECRET):
+    # Deliberately not json.dumps(...) defaults: odd spacing proves the ledger keeps the bytes as sent.
+    payload = json.dumps(event, indent=1)
+    response = client.post("/api/payments/webhook", data=payload,
+                           headers={"Stripe-Signature": sign_payload(payload, secret),
+                                    "Content-Type": "application/json"})
+    return response, payload
+
+
+def make_booking(cur, time_string, email="client@gmail.com"):
+    from occupancy import mark_booked
+
+    cur.execute("""
+                INSERT INTO users (name, email, password_hash)
+                VALUES ('Client', %s, 'x')
+                ON CONFLICT (email) DO UPDATE SET name = EXCLUDED.name
+                RETURNING id;
+                """, (email,))
+    user_id = cur.fetchone()["id"]
+    cur.execute("""
+                INSERT INTO bookings (user_id, service, date, time, duration, payment_status)
+                VALUES (%s, %s, %s, %s, 60, 'pending')
+                RETURNING id;
+                """, (user_id, SERVICE, BOOKING_DATE, time_string))
+    booking_id = cur.fetchone()["id"]
+    mark_booked(cur, [(SERVICE, BOOKING_DATE, time_string, 60)])
+    cur.connection.commit()
+    return booking_id
+
+
+def payment_status(cur, booking_id):
+    cur.execute("SELECT payment_status FROM bookings WHERE id = %s;", (booking_id,))
+    status = cur.fetchone()["payment_status"]
+    cur.connection.commit()
+    return status
+
+
+def ledger(cur):
+    cur.execute("SELECT id, raw_payload, processed_at, attempts FROM stripe_events ORDER BY received_at, id;")
+    rows = cur.fetchall()
+    cur.connection.commit()
+    return rows
+
+
+def test_bad_signature_is_rejected_and_not_stored(client, db_cursor):
+    response, _ = post_event(client, fake_event("evt_bad", 1), secret="whsec_wrong")
+
+    assert response.status_code == 400
+    assert ledger(db_cursor) == []
+
+
+def test_ledger_keeps_signed_bytes_and_dedupes_retries(client, db_cursor):
+    event = fake_event("evt_dup", 1)
+
+    first, payload = post_event(client, event)
+    retry, _ = post_event(client, event)
+
+    assert first.status_code == 200
+    assert retry.status_code == 200
+    rows = ledger(db_cursor)
+    assert [row["id"] for row in rows] == ["evt_dup"]
+    assert rows[0]["raw_payload"] == payload
+
+
+def test_duplicate_event_is_applied_once(client, db_cursor):
+    from webhook_worker import WebhookWorker, ingest_event
+
+    booking_id = make_booking(db_cursor, "10:00")
+    payload = json.dumps(fake_event("evt_once", booking_id))
+    assert ingest_event(payload) is True
+    assert ingest_event(payload) is False
+
+    worker = WebhookWorker()
+    assert worker.process_batch() == 1
+    assert worker.process_batch() == 0
+    assert payment_status(db_cursor, booking_id) == "paid"
+    assert ledger(db_cursor)[0]["attempts"] == 1
+
+
+def test_out_of_order_and_unrelated_events(client, db_cursor):
+    from webhook_worker import WebhookWorker
+
+    early = make_booking(db_cursor, "09:00")
+    late = make_booking(db_cursor, "11:00")
+    # Stripe doesn't promise delivery order: the later booking's event lands first,
+    # with an event type we ignore and one for a booking that no longer exists in between.
+    for event in (fake_event("evt_late", late),
+                  fake_event("evt_other", late, event_type="payment_intent.created"),
+                  fake_event("evt_gone", 999999),
+                  fake_event("evt_early", early)):
+        assert post_event(client, event)[0].status_code == 200
+
+    assert WebhookWorker().process_batch() == 4
+
+    assert payment_status(db_cursor, early) == "paid"
+    assert payment_status(db_cursor, late) == "paid"
+    assert all(row["processed_at"] is not None for row in ledger(db_cursor))
+
+
+def test_replay_reapplies_safely(client, db_cursor):
+    from webhook_worker import WebhookWorker, replay_events
+
+    booking_id = make_booking(db_cursor, "12:00")
+    post_event(client, fake_event("evt_replay", booking_id))
+    worker = WebhookWorker()
+    assert worker.process_batch() == 1
+
+    assert replay_events(["evt_replay"]) == ["evt_replay"]
+    assert ledger(db_cursor)[0]["processed_at"] is None
+    assert worker.process_batch() == 1
+    assert payment_status(db_cursor, booking_id) == "paid"
+    assert ledger(db_cursor)[0]["processed_at"] is not None
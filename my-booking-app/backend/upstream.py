@@ -0,0 +1,178 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+
+class UpstreamUnavailable(Exception):
+    # Raised instead of hanging: breaker open, queue full, timed out or out of retries.
+    # Errors outside `retry_on` (bad request, declined card, auth) pass through unchanged.
+
+    def __init__(self, name, reason):
+        super().__init__(f"{name} unavailable: {reason}")
+        self.name = name
+        self.reason = reason
+
+
+class CircuitBreaker:
+    # closed -> open after `threshold` consecutive failures; after `reset_seconds`
+    # one trial call is let through (half-open) and its result decides the state.
+
+    def __init__(self, threshold=5, reset_seconds=30.0):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def cancel_trial(self):
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == "half_open" or self.failures >= self.threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def retry_after(self):
+        with self._lock:
+            if self.state != "open":
+                return 0
+            return max(0, int(self.reset_seconds - (time.monotonic() - self.opened_at)) + 1)
+
+
+class Upstream:
+    # Runs calls to one external service on its own bounded thread pool so a
+    # slow provider can only tie up `max_workers` threads, never the web workers.
+    # Only `retry_on` errors (connection, timeout, rate limit, 5xx) are retried and
+    # count against the breaker; anything else means the provider answered.
+
+    def __init__(self, name, max_workers=4, max_queue=8, timeout=10.0, retries=2,
+                 backoff=0.25, breaker=None, retry_on=(ConnectionError, TimeoutError), observer=None):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.retry_on = retry_on
+        self.breaker = breaker or CircuitBreaker()
+        # observer(name, outcome, seconds) is called once per call, e.g. for metrics.
+        self.observer = observer
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"upstream-{name}")
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "timeouts": 0,
+            "client_errors": 0,
+            "rejected_busy": 0,
+            "rejected_open": 0,
+            "seconds_total": 0.0,
+        }
+
+    def call(self, fn, *args, **kwargs):
+        self._count("calls")
+        if not self.breaker.allow():
+            self._count("rejected_open")
+            self._observe("rejected", 0.0)
+            raise UpstreamUnavailable(self.name, "circuit open")
+
+        if not self._slots.acquire(blocking=False):
+            # If the breaker let a half-open trial through, hand the trial back unused.
+            self.breaker.cancel_trial()
+            self._count("rejected_busy")
+            self._observe("rejected", 0.0)
+            raise UpstreamUnavailable(self.name, "too many requests in flight")
+
+        started = time.monotonic()
+        outcome = "error"
+        # A timed-out call keeps running on the pool; its slot is only freed once it really ends.
+        abandoned = None
+        try:
+            attempt = 0
+            while True:
+                future = self._executor.submit(fn, *args, **kwargs)
+                try:
+                    result = future.result(timeout=self.timeout)
+                    self.breaker.record_success()
+                    self._count("successes")
+                    outcome = "ok"
+                    return result
+                except FutureTimeout:
+                    # A slow upstream stays slow; retrying would just hold the caller longer.
+                    future.cancel()
+                    abandoned = future
+                    self._count("timeouts")
+                    self._count("failures")
+                    outcome = "timeout"
+                    self.breaker.record_failure()
+                    raise UpstreamUnavailable(self.name, "timed out")
+                except self.retry_on as e:
+                    error = e
+                except Exception:
+                    # The provider is up and said no; retrying or tripping the breaker won't help.
+                    self.breaker.record_success()
+                    self._count("client_errors")
+                    outcome = "client_error"
+                    raise
+
+                if attempt >= self.retries:
+                    self.breaker.record_failure()
+                    self._count("failures")
+                    raise UpstreamUnavailable(self.name, str(error)) from error
+
+                attempt += 1
+                self._count("retries")
+                # Full jitter so a burst of failing requests doesn't retry in lockstep.
+                time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._stats["seconds_total"] += elapsed
+            if abandoned is not None:
+                # Runs at once if cancel() won (the call never started).
+                abandoned.add_done_callback(lambda _future: self._slots.release())
+            else:
+                self._slots.release()
+            self._observe(outcome, elapsed)
+
+    def _observe(self, outcome, seconds):
+        if self.observer:
+            try:
+                self.observer(self.name, outcome, seconds)
+            except Exception as e:
+                print("Upstream observer error:", e)
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["breaker_state"] = self.breaker.state
+        return stats
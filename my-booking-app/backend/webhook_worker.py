@@ -0,0 +1,238 @@
+import argparse
+import json
+import os
+import threading
+import time
+
+from db import get_db
+
+
+# Stripe webhooks are written to an append-only ledger (stripe_events) and
+# acknowledged straight away; this worker applies them to bookings in batches.
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "50"))
+WEBHOOK_POLL_SECONDS = float(os.getenv("WEBHOOK_POLL_SECONDS", "2"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+
+PAID_EVENT_TYPES = {"checkout.session.completed"}
+
+
+def ingest_event(raw_payload):
+    # raw_payload: the webhook body as Stripe signed it (already verified).
+    # Returns True for a new event, False for a Stripe retry we've already stored.
+    event = json.loads(raw_payload)
+    connection = get_db()
+    try:
+        cur = connection.cursor()
+        cur.execute("""
+                    INSERT INTO stripe_events (id, type, payload, raw_payload)
+                    VALUES (%s, %s, %s::jsonb, %s)
+                    ON CONFLICT (id) DO NOTHING
+                    RETURNING id;
+                    """, (event["id"], event["type"], raw_payload, raw_payload))
+        inserted = cur.fetchone() is not None
+        connection.commit()
+        return inserted
+    finally:
+        connection.close()
+
+
+def _booking_id(event):
+    if event.get("type") not in PAID_EVENT_TYPES:
+        return None
+    metadata = ((event.get("data") or {}).get("object") or {}).get("metadata") or {}
+    booking_id = metadata.get("booking_id")
+    return int(booking_id) if booking_id and str(booking_id).isdigit() else None
+
+
+class WebhookWorker:
+
+    def __init__(self, batch_size=WEBHOOK_BATCH_SIZE, poll_seconds=WEBHOOK_POLL_SECONDS,
+                 max_attempts=WEBHOOK_MAX_ATTEMPTS):
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stats = {
+            "batches": 0,
+            "processed": 0,
+            "failed": 0,
+            "last_batch_at": None,
+            "last_error": None,
+        }
+
+    def ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self.run_forever, name="webhook-worker", daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def run_forever(self):
+        while True:
+            try:
+                # Keep draining while there's a backlog; otherwise sleep until poked or the poll interval passes.
+                if self.process_batch() >= self.batch_size:
+                    continue
+            except Exception as e:
+                print("Webhook worker error:", e)
+                with self._lock:
+                    self._stats["last_error"] = str(e)
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def process_batch(self):
+        connection = get_db()
+        try:
+            cur = connection.cursor()
+            # SKIP LOCKED lets several workers (or web processes) drain the ledger without stepping on each other.
+            cur.execute("""
+                        SELECT id, payload
+                        FROM stripe_events
+                        WHERE processed_at IS NULL AND attempts < %s
+                        ORDER BY received_at ASC
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED;
+                        """, (self.max_attempts, self.batch_size))
+            events = cur.fetchall()
+            if not events:
+                connection.rollback()
+                return 0
+
+            try:
+                cur.execute("SAVEPOINT apply_batch;")
+                self._apply(cur, events)
+                cur.execute("RELEASE SAVEPOINT apply_batch;")
+                failed = []
+            except Exception as e:
+                # One bad event shouldn't block the rest: retry them one at a time.
+                cur.execute("ROLLBACK TO SAVEPOINT apply_batch;")
+                print("Webhook batch failed, isolating events:", e)
+                failed = self._apply_one_by_one(cur, events)
+
+            failed_ids = {event_id for event_id, _ in failed}
+            cur.execute("""
+                        UPDATE stripe_events
+                        SET processed_at = NOW(), attempts = attempts + 1, last_error = NULL
+                        WHERE id = ANY(%s);
+                        """, ([e["id"] for e in events if e["id"] not in failed_ids],))
+            for event_id, error in failed:
+                cur.execute("""
+                            UPDATE stripe_events
+                            SET attempts = attempts + 1, last_error = %s
+                            WHERE id = %s;
+                            """, (error[:500], event_id))
+            connection.commit()
+        finally:
+            connection.close()
+
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["processed"] += len(events) - len(failed)
+            self._stats["failed"] += len(failed)
+            self._stats["last_batch_at"] = time.time()
+        return len(events)
+
+    def _apply(self, cur, events):
+        # Payment status doesn't change which slots are free, so there's no
+        # occupancy or availability cache to touch here.
+        booking_ids = [b for b in (_booking_id(e["payload"]) for e in events) if b is not None]
+        if not booking_ids:
+            return
+        cur.execute("""
+                    UPDATE bookings
+                    SET payment_status = 'paid',
+                        payment_method = COALESCE(payment_method, 'online')
+                    WHERE id = ANY(%s);
+                    """, (booking_ids,))
+
+    def _apply_one_by_one(self, cur, events):
+        failed = []
+        for event in events:
+            try:
+                cur.execute("SAVEPOINT apply_event;")
+                self._apply(cur, [event])
+                cur.execute("RELEASE SAVEPOINT apply_event;")
+            except Exception as e:
+                cur.execute("ROLLBACK TO SAVEPOINT apply_event;")
+                failed.append((event["id"], str(e)))
+        return failed
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        connection = get_db()
+        try:
+            cur = connection.cursor()
+            cur.execute("""
+                        SELECT
+                            COUNT(*) FILTER (WHERE processed_at IS NULL AND attempts < %s) AS pending,
+                            COUNT(*) FILTER (WHERE processed_at IS NULL AND attempts >= %s) AS dead,
+                            COUNT(*) FILTER (WHERE processed_at IS NULL AND attempts > 0) AS retrying,
+                            EXTRACT(EPOCH FROM NOW() - MIN(received_at) FILTER (WHERE processed_at IS NULL))
+                                AS lag_seconds
+                        FROM stripe_events;
+                        """, (self.max_attempts, self.max_attempts))
+            stats.update(cur.fetchone())
+        finally:
+            connection.close()
+        stats["lag_seconds"] = float(stats["lag_seconds"] or 0)
+        return stats
+
+
+def replay_events(event_ids=None, since=None):
+    # Marks ledger entries unprocessed again so the worker re-applies them.
+    # Applying a paid event twice is harmless, so replay is always safe.
+    filters = []
+    values = []
+    if event_ids:
+        filters.append("id = ANY(%s)")
+        values.append(list(event_ids))
+    if since:
+        filters.append("received_at >= %s")
+        values.append(since)
+    if not filters:
+        raise ValueError("Replay needs event ids or a since timestamp")
+
+    connection = get_db()
+    try:
+        cur = connection.cursor()
+        cur.execute(f"""
+                    UPDATE stripe_events
+                    SET processed_at = NULL, attempts = 0, last_error = NULL
+                    WHERE {" AND ".join(filters)}
+                    RETURNING id;
+                    """, tuple(values))
+        replayed = [row["id"] for row in cur.fetchall()]
+        connection.commit()
+        return replayed
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    # Standalone worker (python webhook_worker.py) or replay:
+    #   python webhook_worker.py --replay evt_123 evt_456
+    #   python webhook_worker.py --replay-since 2026-01-01T00:00:00Z
+    parser = argparse.ArgumentParser(description="Apply queued Stripe webhook events")
+    parser.add_argument("--replay", nargs="*", metavar="EVENT_ID")
+    parser.add_argument("--replay-since")
+    parser.add_argument("--once", action="store_true", help="process one batch and exit")
+    args = parser.parse_args()
+
+    if args.replay or args.replay_since:
+        print("Replayed:", replay_events(args.replay, args.replay_since))
+
+    worker = WebhookWorker()
+    if args.once:
+        print("Processed:", worker.process_batch())
+    else:
+        worker.run_forever()
@@ -36,6 +36,8 @@ export default function AdminBookings() {
   const [statusMemo, setStatusMemo] = useState({ tone: "", text: "" });
   const [loading, setLoading] = useState(true);
   const [deleting, setDeleting] = useState("");
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     if (!isAdminUser()) {
@@ -58,6 +60,7 @@ export default function AdminBookings() {
           ? payload
           : payload.bookings || [];
         setBookings(list);
+        setNextCursor(payload.next_cursor || null);
       } catch (error) {
         setStatusMemo({
           tone: "error",
@@ -71,6 +74,32 @@ export default function AdminBookings() {
     fetchBookings();
   }, [navigate]);
 
+  // The API pages bookings by cursor; each click appends the next page.
+  async function loadMore() {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    setStatusMemo({ tone: "", text: "" });
+    try {
+      const res = await fetch(
+        `${API_ROOT}/api/admin/bookings?cursor=${encodeURIComponent(nextCursor)}`,
+        { headers: buildAuthHeaders() }
+      );
+      const payload = await res.json().catch(() => ({}));
+      if (!res.ok) {
+        throw new Error(payload.error || "Unable to load bookings.");
+      }
+      setBookings((prev) => [...prev, ...(payload.bookings || [])]);
+      setNextCursor(payload.next_cursor || null);
+    } catch (error) {
+      setStatusMemo({
+        tone: "error",
+        text: error.message || "Failed to fetch bookings.",
+      });
+    } finally {
+      setLoadingMore(false);
+    }
+  }
+
   async function deleteBooking(id) {
     const confirm = window.confirm("Delete this booking?");
     if (!confirm) return;
@@ -215,6 +244,18 @@ export default function AdminBookings() {
                   })}
                 </tbody>
               </table>
+              {nextCursor && (
+                <div className="admin-table-actions">
+                  <button
+                    type="button"
+                    className="admin-button"
+                    onClick={loadMore}
+                    disabled={loadingMore}
+                  >
+                    {loadingMore ? "Loading..." : "Load more"}
+                  </button>
+                </div>
+              )}
             </div>
           )}
         </section>
@@ -35,6 +35,28 @@ export default function AdminUsers() {
   const [users, setUsers] = useState([]);
   const [statusMemo, setStatusMemo] = useState({ tone: "", text: "" });
   const [loading, setLoading] = useState(true);
+  const [search, setSearch] = useState("");
+  const [query, setQuery] = useState("");
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  // Search and paging both run server-side; cursor appends the next page to the current list.
+  async function fetchUsers(term, cursor) {
+    const params = new URLSearchParams();
+    if (term) params.set("q", term);
+    if (cursor) params.set("cursor", cursor);
+    const res = await fetch(`${API_ROOT}/api/admin/users?${params}`, {
+      headers: buildAuthHeaders(),
+    });
+    const payload = await res.json().catch(() => ({}));
+    if (!res.ok) {
+      throw new Error(payload.error || "Unable to load users.");
+    }
+    return {
+      list: Array.isArray(payload) ? payload : payload.users || [],
+      next: payload.next_cursor || null,
+    };
+  }
 
   useEffect(() => {
     if (!isAdminUser()) {
@@ -42,19 +64,13 @@ export default function AdminUsers() {
       return;
     }
 
-    async function fetchUsers() {
+    async function loadFirstPage() {
       setLoading(true);
       setStatusMemo({ tone: "", text: "" });
       try {
-        const res = await fetch(`${API_ROOT}/api/admin/users`, {
-          headers: buildAuthHeaders(),
-        });
-        const payload = await res.json().catch(() => ({}));
-        if (!res.ok) {
-          throw new Error(payload.error || "Unable to load users.");
-        }
-        const list = Array.isArray(payload) ? payload : payload.users || [];
+        const { list, next } = await fetchUsers(query);
         setUsers(list);
+        setNextCursor(next);
       } catch (error) {
         setStatusMemo({
           tone: "error",
@@ -65,8 +81,30 @@ export default function AdminUsers() {
       }
     }
 
-    fetchUsers();
-  }, [navigate]);
+    loadFirstPage();
+  }, [navigate, query]);
+
+  async function loadMore() {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const { list, next } = await fetchUsers(query, nextCursor);
+      setUsers((prev) => [...prev, ...list]);
+      setNextCursor(next);
+    } catch (error) {
+      setStatusMemo({
+        tone: "error",
+        text: error.message || "Failed to fetch users.",
+      });
+    } finally {
+      setLoadingMore(false);
+    }
+  }
+
+  function handleSearch(e) {
+    e.preventDefault();
+    setQuery(search.trim());
+  }
 
   return (
     <div className="admin-page">
@@ -76,6 +114,19 @@ export default function AdminUsers() {
           <h1 className="admin-heading">Users</h1>
           <p className="admin-text">Read-only list of all registered users.</p>
 
+          <form className="admin-actions" onSubmit={handleSearch}>
+            <input
+              className="admin-input"
+              type="search"
+              placeholder="Search by name or email"
+              value={search}
+              onChange={(e) => setSearch(e.target.value)}
+            />
+            <button type="submit" className="admin-button">
+              Search
+            </button>
+          </form>
+
           {statusMemo.text && (
             <div
               className={`admin-status ${
@@ -99,6 +150,7 @@ export default function AdminUsers() {
                     <th>Name</th>
                     <th>Email</th>
                     <th>Created</th>
+                    <th>Bookings</th>
                     <th>Admin</th>
                   </tr>
                 </thead>
@@ -113,6 +165,7 @@ export default function AdminUsers() {
                           ? new Date(user.created_at).toLocaleString()
                           : "—"}
                       </td>
+                      <td data-label="Bookings">{user.booking_count ?? 0}</td>
                       <td data-label="Admin">
                         {user.is_admin ? (
                           <span className="admin-badge">Admin</span>
@@ -124,6 +177,18 @@ export default function AdminUsers() {
                   ))}
                 </tbody>
               </table>
+              {nextCursor && (
+                <div className="admin-table-actions">
+                  <button
+                    type="button"
+                    className="admin-button"
+                    onClick={loadMore}
+                    disabled={loadingMore}
+                  >
+                    {loadingMore ? "Loading..." : "Load more"}
+                  </button>
+                </div>
+              )}
             </div>
           )}
         </section>
@@ -2,6 +2,7 @@ import { useEffect, useRef, useState } from "react";
 import Header from "./components/Header";
 import Footer from "./components/Footer";
 import "./Assistant.css";
+import { streamAnswer } from "./streamAnswer";
 
 const API_ROOT = "https://bookingsystem-production-19c2.up.railway.app";
 
@@ -9,6 +10,8 @@ export default function Assistant() {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState("");
   const [loading, setLoading] = useState(false);
+  // Id of the reply being streamed in; the typing dots give way to it on the first token.
+  const [streamingId, setStreamingId] = useState(null);
   const chatEndRef = useRef(null);
   const msgIdRef = useRef(0);
 
@@ -24,6 +27,12 @@ export default function Assistant() {
     return id;
   };
 
+  const appendToMessage = (id, chunk) => {
+    setMessages((prev) =>
+      prev.map((msg) => (msg.id === id ? { ...msg, content: msg.content + chunk } : msg))
+    );
+  };
+
   async function sendToAssistant(text) {
     const trimmed = text.trim();
     if (!trimmed) return;
@@ -32,27 +41,24 @@ export default function Assistant() {
     setInput("");
     setLoading(true);
 
+    let replyId = null;
     try {
-      const payload = { query: trimmed };
-
-      const res = await fetch(`${API_ROOT}/api/assistant`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify(payload),
-      });
-      const data = await res.json().catch(() => ({}));
-
-      if (!res.ok) throw new Error(data.error || "Unable to reply right now.");
-
-      const reply =
-        data.message ||
-        data.answer ||
-        data.response ||
-        "I couldn't find an answer just now.";
-      addMessage({
-        role: "assistant",
-        content: reply
-      });
+      await streamAnswer(
+        `${API_ROOT}/api/assistant`,
+        trimmed,
+        (chunk) => {
+          if (replyId === null) {
+            replyId = addMessage({ role: "assistant", content: chunk });
+            setStreamingId(replyId);
+          } else {
+            appendToMessage(replyId, chunk);
+          }
+        },
+        "Unable to reply right now."
+      );
+      if (replyId === null) {
+        addMessage({ role: "assistant", content: "I couldn't find an answer just now." });
+      }
     } catch (error) {
       addMessage({
         role: "assistant",
@@ -60,6 +66,7 @@ export default function Assistant() {
       });
     } finally {
       setLoading(false);
+      setStreamingId(null);
     }
   }
 
@@ -108,7 +115,7 @@ export default function Assistant() {
               </div>
             ))}
 
-            {loading && (
+            {loading && !streamingId && (
               <div className="assistant-bubble assistant-bubble--bot">
                 <span className="assistant-typing">
                   <span className="dot" />
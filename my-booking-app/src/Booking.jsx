@@ -6,6 +6,8 @@ import Button from "./Button";
 import "./Booking.css";
 
 const API_ROOT = "https://bookingsystem-production-19c2.up.railway.app";
+// Live slot streams are served by the separate gevent process (backend/gunicorn_live.conf.py).
+const LIVE_API_ROOT = import.meta.env.VITE_LIVE_API_ROOT || API_ROOT;
 
 // Core slot template used as a UI fallback whenever the API can't provide data.
 // These are not "real" slots—they're only shown when the backend gives us nothing.
@@ -355,9 +357,13 @@ export default function Booking() {
 
         if (freshPocket.token) {
           try {
-            const mineRes = await fetch(`${API_ROOT}/api/my-bookings`, {
-              headers: buildHeaders(freshPocket.token),
-            });
+            // Only this day's upcoming bookings matter for marking slots as "yours".
+            const mineRes = await fetch(
+              `${API_ROOT}/api/my-bookings?view=upcoming&date=${encodeURIComponent(dtPick)}&limit=50`,
+              {
+                headers: buildHeaders(freshPocket.token),
+              }
+            );
             const minePayload = await mineRes.json().catch(() => ({}));
             if (mineRes.ok) {
               const mineList = Array.isArray(minePayload)
@@ -409,6 +415,54 @@ export default function Booking() {
     };
   }, [svcPick, dtPick, slotPulse]);
 
+  // Live updates: the server pushes slot changes for this service/day (anyone's bookings,
+  // cancellations), so the grid stays current without polling.
+  // Background tabs drop their stream and re-open it on return, so idle tabs hold no connection.
+  useEffect(() => {
+    if (!svcPick || !dtPick || typeof EventSource === "undefined") return;
+    const params = new URLSearchParams({ service: svcPick, date: dtPick });
+    let stream = null;
+
+    function applySlots(event) {
+      const payload = JSON.parse(event.data || "{}");
+      if (payload.service !== svcPick || payload.date !== dtPick) return;
+      const changes = payload.slots || {};
+      setSlotStack((prev) =>
+        prev.map((slot) => {
+          const key = normalizeTimeValue(slot.time);
+          if (!(key in changes)) return slot;
+          // Slots the user already holds stay marked as theirs.
+          return slot.owned ? slot : { ...slot, available: Boolean(changes[key]) };
+        })
+      );
+    }
+
+    function openStream() {
+      if (stream) return;
+      stream = new EventSource(`${LIVE_API_ROOT}/api/availability/live?${params}`);
+      stream.addEventListener("snapshot", applySlots);
+      stream.addEventListener("delta", applySlots);
+    }
+
+    function closeStream() {
+      if (!stream) return;
+      stream.close();
+      stream = null;
+    }
+
+    function syncWithVisibility() {
+      if (document.hidden) closeStream();
+      else openStream();
+    }
+
+    syncWithVisibility();
+    document.addEventListener("visibilitychange", syncWithVisibility);
+    return () => {
+      document.removeEventListener("visibilitychange", syncWithVisibility);
+      closeStream();
+    };
+  }, [svcPick, dtPick]);
+
   // Handles POST /api/book and re-fetches availability on success so the new slot is instantly blocked out.
   // Most of the logic is simple guards: require a slot, require a token, then send the payload.
   async function handleBooking() {
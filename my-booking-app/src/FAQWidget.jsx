@@ -1,5 +1,6 @@
 import { useEffect, useRef, useState } from "react";
 import "./FAQWidget.css";
+import { streamAnswer } from "./streamAnswer";
 
 const API_ROOT = "https://bookingsystem-production-19c2.up.railway.app";
 
@@ -8,6 +9,8 @@ export default function FAQWidget() {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState("");
   const [loading, setLoading] = useState(false);
+  // Id of the reply being streamed in; the typing dots give way to it on the first token.
+  const [streamingId, setStreamingId] = useState(null);
   const chatEndRef = useRef(null);
   const msgIdRef = useRef(0);
 
@@ -23,6 +26,12 @@ export default function FAQWidget() {
     return id;
   };
 
+  const appendToMessage = (id, chunk) => {
+    setMessages((prev) =>
+      prev.map((msg) => (msg.id === id ? { ...msg, content: msg.content + chunk } : msg))
+    );
+  };
+
   async function sendToAssistant(text) {
     const trimmed = text.trim();
     if (!trimmed) return;
@@ -31,27 +40,24 @@ export default function FAQWidget() {
     setInput("");
     setLoading(true);
 
+    let replyId = null;
     try {
-      const payload = { query: trimmed };
-
-      const res = await fetch(`${API_ROOT}/api/assistant`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify(payload),
-      });
-      const data = await res.json().catch(() => ({}));
-
-      if (!res.ok) throw new Error(data.error || "Unable to get an answer right now.");
-
-      const reply =
-        data.message ||
-        data.answer ||
-        data.response ||
-        "I couldn't find an answer yet.";
-      addMessage({
-        role: "assistant",
-        content: reply
-      });
+      await streamAnswer(
+        `${API_ROOT}/api/assistant`,
+        trimmed,
+        (chunk) => {
+          if (replyId === null) {
+            replyId = addMessage({ role: "assistant", content: chunk });
+            setStreamingId(replyId);
+          } else {
+            appendToMessage(replyId, chunk);
+          }
+        },
+        "Unable to get an answer right now."
+      );
+      if (replyId === null) {
+        addMessage({ role: "assistant", content: "I couldn't find an answer yet." });
+      }
     } catch (error) {
       addMessage({
         role: "assistant",
@@ -59,6 +65,7 @@ export default function FAQWidget() {
       });
     } finally {
       setLoading(false);
+      setStreamingId(null);
     }
   }
 
@@ -117,7 +124,7 @@ export default function FAQWidget() {
               </div>
             ))}
 
-            {loading && (
+            {loading && !streamingId && (
               <div className="chat-bubble chat-bubble-bot">
                 <span className="faq-typing">
                   <span className="dot" />
@@ -1,4 +1,4 @@
-import { useState, useEffect, useMemo } from "react";
+import { useState, useEffect } from "react";
 import { Link, useNavigate } from "react-router-dom";
 import Header from "./components/Header";
 import Footer from "./components/Footer";
@@ -70,18 +70,26 @@ function prettyTime(timeString) {
   return `${hour12}:${minutes} ${suffix}`;
 }
 
-function isPastBooking(dateString, timeString) {
-  // Combine the date and time strings into a timestamp to compare to "now".
-  if (!dateString || !timeString) return false;
-  const cleanTime =
-    timeString.length === 5 && timeString.includes(":")
-      ? `${timeString}:00`
-      : timeString.includes(":")
-        ? timeString
-        : `${timeString}:00`;
-  const combined = new Date(`${dateString}T${cleanTime}`);
-  if (Number.isNaN(combined.getTime())) return false;
-  return combined.getTime() < Date.now();
+// The API splits bookings into "upcoming" and "past" views, each paged with next_cursor.
+async function fetchBookingPage(token, view, cursor) {
+  const params = new URLSearchParams({ view });
+  if (cursor) params.set("cursor", cursor);
+
+  const res = await fetch(`${API_ROOT}/api/my-bookings?${params}`, {
+    headers: {
+      ...buildAuthHeaders(token),
+      "Content-Type": "application/json",
+    },
+  });
+
+  const payload = await res.json().catch(() => ({}));
+  if (!res.ok) {
+    throw new Error(payload.error || "Unable to fetch bookings.");
+  }
+  return {
+    bookings: payload.bookings || [],
+    nextCursor: payload.next_cursor || null,
+  };
 }
 
 function prettyPaymentMethod(method) {
@@ -107,7 +115,11 @@ export default function MyBookings() {
     return window.localStorage.getItem(TOKEN_KEY) || "";
   });
 
-  const [bookingStack, setBookingStack] = useState([]);
+  const [upcomingBookings, setUpcomingBookings] = useState([]);
+  const [pastBookings, setPastBookings] = useState([]);
+  // Cursor per view; null means there is nothing more to load.
+  const [pageCursors, setPageCursors] = useState({ upcoming: null, past: null });
+  const [loadingMore, setLoadingMore] = useState("");
   // sendGate tracks loading and which booking (if any) is being cancelled.
   const [sendGate, setSendGate] = useState({ probing: false, canceling: "" });
   // statusMemo feeds the inline status banner.
@@ -132,28 +144,19 @@ export default function MyBookings() {
       setViewStage("loading");
 
       try {
-        const res = await fetch(`${API_ROOT}/api/my-bookings`, {
-          headers: {
-            ...buildAuthHeaders(tokenPocket),
-            "Content-Type": "application/json",
-          },
-        });
-
-        const payload = await res.json().catch(() => ({}));
-        if (!res.ok) {
-          throw new Error(payload.error || "Unable to fetch bookings.");
-        }
-
-        const list = Array.isArray(payload)
-          ? payload
-          : payload.bookings || [];
+        const [upcoming, past] = await Promise.all([
+          fetchBookingPage(tokenPocket, "upcoming"),
+          fetchBookingPage(tokenPocket, "past"),
+        ]);
 
-        if (list.length === 0) {
+        if (upcoming.bookings.length === 0 && past.bookings.length === 0) {
           setViewStage("empty");
         } else {
           setViewStage("ready");
         }
-        setBookingStack(list);
+        setUpcomingBookings(upcoming.bookings);
+        setPastBookings(past.bookings);
+        setPageCursors({ upcoming: upcoming.nextCursor, past: past.nextCursor });
       } catch (error) {
         console.error(error);
         setViewStage("error");
@@ -169,6 +172,31 @@ export default function MyBookings() {
     fetchBookings();
   }, [tokenPocket]);
 
+  async function loadMore(view) {
+    const cursor = pageCursors[view];
+    if (!cursor) return;
+
+    setLoadingMore(view);
+    try {
+      const page = await fetchBookingPage(tokenPocket, view, cursor);
+      const append = (prev) => [...prev, ...page.bookings];
+      if (view === "upcoming") {
+        setUpcomingBookings(append);
+      } else {
+        setPastBookings(append);
+      }
+      setPageCursors((prev) => ({ ...prev, [view]: page.nextCursor }));
+    } catch (error) {
+      console.error(error);
+      setStatusMemo({
+        tone: "error",
+        text: error.message || "Something went wrong fetching bookings.",
+      });
+    } finally {
+      setLoadingMore("");
+    }
+  }
+
   function confirmCancel(bookingId) {
     if (!tokenPocket) {
       setStatusMemo({
@@ -203,9 +231,11 @@ export default function MyBookings() {
         throw new Error(payload.error || "Unable to cancel booking.");
       }
 
-      setBookingStack((prev) => {
+      setUpcomingBookings((prev) => {
         const nextList = prev.filter((booking) => booking.id !== bookingId);
-        setViewStage(nextList.length === 0 ? "empty" : "ready");
+        setViewStage(
+          nextList.length === 0 && pastBookings.length === 0 ? "empty" : "ready"
+        );
         return nextList;
       });
 
@@ -239,24 +269,6 @@ export default function MyBookings() {
     navigate("/login");
   }
 
-  const { upcomingBookings, pastBookings } = useMemo(() => {
-    // Normalize bookings into two buckets so the render can stay simple.
-    const upcoming = [];
-    const past = [];
-    bookingStack.forEach((booking) => {
-      const pastFlag =
-        typeof booking.is_past === "boolean"
-          ? booking.is_past
-          : isPastBooking(booking.date, booking.time);
-      if (pastFlag) {
-        past.push(booking);
-      } else {
-        upcoming.push(booking);
-      }
-    });
-    return { upcomingBookings: upcoming, pastBookings: past };
-  }, [bookingStack]);
-
   const loading = viewStage === "loading";
 
   return (
@@ -379,6 +391,16 @@ export default function MyBookings() {
                     </article>
                   ))
                 )}
+                {pageCursors.upcoming && (
+                  <button
+                    type="button"
+                    className="bookings-inline-link"
+                    onClick={() => loadMore("upcoming")}
+                    disabled={loadingMore === "upcoming"}
+                  >
+                    {loadingMore === "upcoming" ? "Loading..." : "Load more"}
+                  </button>
+                )}
               </div>
 
               {pastBookings.length > 0 && (
@@ -432,6 +454,16 @@ export default function MyBookings() {
                       </div>
                     </article>
                   ))}
+                  {pageCursors.past && (
+                    <button
+                      type="button"
+                      className="bookings-inline-link"
+                      onClick={() => loadMore("past")}
+                      disabled={loadingMore === "past"}
+                    >
+                      {loadingMore === "past" ? "Loading..." : "Load more"}
+                    </button>
+                  )}
                 </div>
               )}
             </>
@@ -0,0 +1,57 @@
+// Asks the assistant with stream: true and reads the server-sent events off the
+// response body as they arrive, so the reply renders token by token instead of
+// waiting for the whole answer. onToken(text) runs for each chunk; the promise
+// resolves with the full answer. Cached and fallback answers may come back as
+// plain JSON, which is handled the same way (one chunk).
+export async function streamAnswer(url, query, onToken, fallbackError) {
+  const res = await fetch(url, {
+    method: "POST",
+    headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+    body: JSON.stringify({ query, stream: true }),
+  });
+
+  const contentType = res.headers.get("Content-Type") || "";
+  if (!res.ok || !res.body || !contentType.includes("text/event-stream")) {
+    const data = await res.json().catch(() => ({}));
+    if (!res.ok) throw new Error(data.error || fallbackError);
+    const answer = data.message || data.answer || data.response || "";
+    if (answer) onToken(answer);
+    return answer;
+  }
+
+  const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = "";
+  let answer = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) return answer;
+    buffer += value;
+
+    // Frames end with a blank line; anything after the last one is still arriving.
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const frame = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = "message";
+      const data = [];
+      for (const line of frame.split("\n")) {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data.push(line.slice(5).replace(/^ /, ""));
+      }
+      if (data.length === 0) continue;
+      const payload = JSON.parse(data.join("\n"));
+
+      if (event === "token") {
+        answer += payload.text;
+        onToken(payload.text);
+      } else if (event === "done") {
+        reader.cancel();
+        return payload.answer || answer;
+      } else if (event === "error") {
+        reader.cancel();
+        throw new Error(payload.error || fallbackError);
+      }
+    }
+  }
+}